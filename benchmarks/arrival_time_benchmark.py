@@ -0,0 +1,48 @@
+"""
+Benchmark of the arrival time check backends on a synthetic network (see benchmarks.network_generator).
+The network is streamed into the processor, so only the columns of the stops are kept in the memory.
+Routes are built and numpy is imported before the timer starts, only the check itself is measured.
+
+Run from the root of the project:
+    python -m benchmarks.arrival_time_benchmark --rows 1000000 --time-error-rate 0.001
+"""
+import argparse
+import time
+
+from benchmarks.network_generator import generate_network, add_network_arguments, network_options
+from utils.processor_columns import has_numpy
+from utils.processors import DatabaseProcessor
+
+ROWS = 1_000_000
+
+
+def generate_processor(rows: int, options: dict, backend: str) -> DatabaseProcessor:
+    """Creates processor with computed routes of the synthetic network."""
+    lines = max(1, rows // options["stops_per_line"])
+    processor = DatabaseProcessor(generate_network(lines, **options), arrival_time_backend=backend)
+    processor.check_bus_info()
+    return processor
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=ROWS)
+    add_network_arguments(parser)
+    parser.set_defaults(time_error_rate=0.001)
+    args = parser.parse_args()
+    options = network_options(args)
+    backends = ["python", "numpy"] if has_numpy() else ["python"]
+    results = {}
+    if "numpy" in backends:
+        import numpy  # noqa: F401
+    for backend in backends:
+        processor = generate_processor(args.rows, options, backend)
+        start = time.perf_counter()
+        results[backend] = processor.check_time_errors().errors
+        print(f"{backend}: {time.perf_counter() - start:.3f} s for {args.rows} rows")
+    if len(results) > 1:
+        print("backends agree:", results["python"] == results["numpy"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Benchmark of the import time of the modules, every import runs in a new interpreter with -X importtime.
+
+Run from the root of the project:
+    python -m benchmarks.import_time_benchmark [module ...]
+"""
+import statistics
+import subprocess
+import sys
+
+MODULES = ("utils.processors", "easyrider")
+REPEAT = 10
+
+
+def import_time(module: str) -> int:
+    """Returns cumulative import time of the module in microseconds, measured in a new interpreter."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1])
+    raise ValueError(f"Import time of {module} isn't found")
+
+
+def main():
+    modules = sys.argv[1:] or MODULES
+    for module in modules:
+        times = [import_time(module) for _ in range(REPEAT)]
+        print(f"{module}: median {statistics.median(times) / 1000:.1f} ms, min {min(times) / 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
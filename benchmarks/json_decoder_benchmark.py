@@ -0,0 +1,53 @@
+"""
+Benchmark of the json decoders of processor_handler on a big synthetic network (see benchmarks.network_generator).
+Every installed decoder reads the file with and without mmap, the streaming reader is measured too.
+
+Run from the root of the project:
+    python -m benchmarks.json_decoder_benchmark [rows] [stops per line]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.network_generator import generate_network, write_network
+from utils.processor_handler import JSON_DECODERS, get_json_decoder, input_database_file, iter_database_file
+
+ROWS = 1_000_000
+STOPS_PER_LINE = 100
+REPEAT = 3
+
+
+def best_time(func) -> float:
+    """Returns the best time of REPEAT runs of the function."""
+    times = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    stops_per_line = int(sys.argv[2]) if len(sys.argv) > 2 else STOPS_PER_LINE
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, "network.json")
+        write_network(file_name, generate_network(max(1, rows // stops_per_line), stops_per_line))
+        size = os.path.getsize(file_name) / 2 ** 20
+        print(f"{rows} rows, {size:.1f} MB")
+        for decoder in JSON_DECODERS[1:]:
+            try:
+                get_json_decoder(decoder)
+            except ImportError:
+                print(f"{decoder}: not installed")
+                continue
+            for use_mmap in (False, True):
+                seconds = best_time(lambda: input_database_file(file_name, decoder, use_mmap))
+                print(f"{decoder}{' mmap' if use_mmap else ''}: {seconds:.3f} s, {size / seconds:.0f} MB/s")
+        seconds = best_time(lambda: sum(1 for _ in iter_database_file(file_name)))
+        print(f"json streamed: {seconds:.3f} s, {size / seconds:.0f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Generator of synthetic bus networks in the format of the test_data.
+Lines are linked by next_stop, have one start and one finish stop and increasing arrival time,
+so the network passes every check unless errors are injected.
+
+Run from the root of the project:
+    python -m benchmarks.network_generator network.json --lines 1000 --stops-per-line 100
+"""
+import argparse
+import json
+import random
+
+STOP_TYPES = ("S", "", "F")
+STEP_MINUTES = 5
+# a_time of the last stop must be before 24:00
+DAY_MINUTES = 24 * 60
+
+
+def generate_network(lines: int, stops_per_line: int, transfer_rate: float = 0.1, on_demand_rate: float = 0.05,
+                     type_error_rate: float = 0.0, format_error_rate: float = 0.0, time_error_rate: float = 0.0,
+                     demand_error_rate: float = 0.0, seed: int = 0):
+    """
+    Yields records of the synthetic network line by line, so big networks aren't kept in the memory.
+
+    :param lines: number of bus lines.
+    :param stops_per_line: number of stops of every line, at least 2.
+    :param transfer_rate: share of the stops whose names are shared with other lines.
+    :param on_demand_rate: share of the other intermediate stops with the "O" type.
+    :param type_error_rate: share of the records with a wrong type of bus_id.
+    :param format_error_rate: share of the records with a wrong format of a_time.
+    :param time_error_rate: share of the records whose arrival time is earlier than the previous one.
+    :param demand_error_rate: share of the intermediate transfer stops with the "O" type.
+    :param seed: seed of the random generator, the same seed gives the same network.
+    """
+    if stops_per_line < 2:
+        raise ValueError("Line must have at least 2 stops")
+    rnd = random.Random(seed)
+    step = max(1, min(STEP_MINUTES, (DAY_MINUTES - 1) // stops_per_line))
+    # every transfer stop is shared by two lines on average
+    transfers = max(1, int(lines * stops_per_line * transfer_rate / 2))
+    transfer_names = [f"Transfer{index} Avenue" for index in range(transfers)]
+    for bus_id in range(1, lines + 1):
+        minutes = rnd.randrange(DAY_MINUTES - step * stops_per_line)
+        for stop_id in range(1, stops_per_line + 1):
+            stop_type = STOP_TYPES[(stop_id > 1) + (stop_id == stops_per_line)]
+            if rnd.random() < transfer_rate:
+                stop_name = rnd.choice(transfer_names)
+                if not stop_type and rnd.random() < demand_error_rate:
+                    stop_type = "O"
+            else:
+                stop_name = f"Line{bus_id}Stop{stop_id} Street"
+                if not stop_type and rnd.random() < on_demand_rate:
+                    stop_type = "O"
+            minutes += step
+            a_time = max(minutes - 2 * step, 0) if rnd.random() < time_error_rate else minutes
+            record = dict(bus_id=bus_id, stop_id=stop_id, stop_name=stop_name,
+                          next_stop=stop_id + 1 if stop_id < stops_per_line else 0,
+                          stop_type=stop_type, a_time=f"{a_time // 60:02}:{a_time % 60:02}")
+            if rnd.random() < type_error_rate:
+                record["bus_id"] = str(bus_id)
+            if rnd.random() < format_error_rate:
+                record["a_time"] = f"{a_time // 60}:{a_time % 60}"
+            yield record
+
+
+def write_network(file_name: str, records) -> None:
+    """Writes records to the json file one by one."""
+    with open(file_name, "w") as file:
+        file.write("[")
+        for index, record in enumerate(records):
+            file.write(",\n" if index else "\n")
+            file.write(json.dumps(record))
+        file.write("\n]\n")
+
+
+def add_network_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds options of generate_network() to the parser."""
+    parser.add_argument("--stops-per-line", type=int, default=100)
+    parser.add_argument("--transfer-rate", type=float, default=0.1)
+    parser.add_argument("--on-demand-rate", type=float, default=0.05)
+    parser.add_argument("--type-error-rate", type=float, default=0.0)
+    parser.add_argument("--format-error-rate", type=float, default=0.0)
+    parser.add_argument("--time-error-rate", type=float, default=0.0)
+    parser.add_argument("--demand-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def network_options(args) -> dict:
+    """Returns options of generate_network() except the number of lines from the parsed arguments."""
+    return dict(stops_per_line=args.stops_per_line, transfer_rate=args.transfer_rate,
+                on_demand_rate=args.on_demand_rate, type_error_rate=args.type_error_rate,
+                format_error_rate=args.format_error_rate, time_error_rate=args.time_error_rate,
+                demand_error_rate=args.demand_error_rate, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file", help="Path to the output .json file.")
+    parser.add_argument("--lines", type=int, default=100)
+    add_network_arguments(parser)
+    args = parser.parse_args()
+    write_network(args.file, generate_network(args.lines, **network_options(args)))
+
+
+if __name__ == "__main__":
+    main()
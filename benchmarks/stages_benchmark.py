@@ -0,0 +1,124 @@
+"""
+Benchmark of every stage of DatabaseProcessor on synthetic networks (see benchmarks.network_generator).
+Stages are run in order of their dependencies, so the time of the stage doesn't include the previous ones.
+Peak memory of the stage is measured by tracemalloc in a separate run, because tracing slows down the code.
+Results are written to the json file, --compare prints stages which became slower than in the other file.
+Records of the network are kept in the memory, 10 million rows need several gigabytes.
+
+Run from the root of the project:
+    python -m benchmarks.stages_benchmark --rows 10000 1000000 --output stages.json
+    python -m benchmarks.stages_benchmark --rows 10000 --output new.json --compare stages.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from benchmarks.network_generator import generate_network, add_network_arguments, network_options
+from utils.processors import DatabaseProcessor
+from utils.processor_errors import ProcessorError
+
+ROWS = (10_000, 1_000_000, 10_000_000)
+STAGES = ("_check_data_type", "_check_format_fields", "_calculate_stops", "_find_transfer_stops",
+          "_check_arrival_time_errors", "_check_demand_errors")
+# stage is reported as a regression if it is slower by this share
+REGRESSION_THRESHOLD = 0.2
+# faster stages are ignored by the comparison, their time is mostly noise
+MIN_SECONDS = 0.01
+
+
+def run_stages(database: list, trace_memory: bool) -> dict:
+    """
+    Runs every stage on a new processor.
+
+    :return: dict, name of the stage -> seconds or peak memory in bytes, None if the stage failed.
+    """
+    processor = DatabaseProcessor(database)
+    results = {}
+    for stage in STAGES:
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            getattr(processor, stage)()
+            value = time.perf_counter() - start
+        except ProcessorError:
+            value = None
+        if trace_memory:
+            if value is not None:
+                value = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        results[stage] = value
+    return results
+
+
+def benchmark(rows: int, options: dict, trace_memory: bool = True) -> dict:
+    """Returns seconds, records per second and peak memory of every stage for the network with rows records."""
+    lines = max(1, rows // options["stops_per_line"])
+    database = list(generate_network(lines, **options))
+    seconds = run_stages(database, False)
+    peak_memory = run_stages(database, True) if trace_memory else dict.fromkeys(STAGES)
+    stages = {}
+    for stage in STAGES:
+        stages[stage] = dict(seconds=seconds[stage], peak_memory=peak_memory[stage],
+                             records_per_second=len(database) / seconds[stage] if seconds[stage] else None)
+    return dict(rows=len(database), lines=lines, stages=stages)
+
+
+def git_commit():
+    """Returns hash of the current commit or None outside of the git repository."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> list:
+    """Returns (rows, stage, baseline seconds, seconds) of the stages which became slower than the threshold."""
+    baseline_runs = {run["rows"]: run["stages"] for run in baseline["runs"]}
+    regressions = []
+    for run in results["runs"]:
+        for stage, result in run["stages"].items():
+            old = baseline_runs.get(run["rows"], {}).get(stage)
+            if not old or old["seconds"] is None or result["seconds"] is None or result["seconds"] < MIN_SECONDS:
+                continue
+            if result["seconds"] > old["seconds"] * (1 + threshold):
+                regressions.append((run["rows"], stage, old["seconds"], result["seconds"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=ROWS, help="Sizes of the networks.")
+    parser.add_argument("--output", default="stages_benchmark.json", help="Path to the json file with results.")
+    parser.add_argument("--compare", default=None, help="Json file with results of the other commit.")
+    parser.add_argument("--no-memory", action="store_true", help="Don't measure peak memory.")
+    add_network_arguments(parser)
+    args = parser.parse_args()
+    options = network_options(args)
+    results = dict(commit=git_commit(), python=platform.python_version(), date=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   network=options, runs=[])
+    for rows in args.rows:
+        run = benchmark(rows, options, not args.no_memory)
+        results["runs"].append(run)
+        for stage, result in run["stages"].items():
+            seconds = "failed" if result["seconds"] is None else f"{result['seconds']:.3f} s"
+            memory = "" if result["peak_memory"] is None else f", {result['peak_memory'] / 2 ** 20:.1f} MB"
+            print(f"{run['rows']} rows, {stage}: {seconds}{memory}")
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = find_regressions(results, json.load(file))
+        for rows, stage, old, new in regressions:
+            print(f"regression: {rows} rows, {stage}: {old:.3f} s -> {new:.3f} s")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Micro-benchmark of per-record validation cost: the type and format checks as they were done before
+the schema registry (patterns compiled inside the loops, two passes over the records) against
+DatabaseProcessor._count_stop_errors, which is the shipped per-record check. Only the checks are timed,
+the records of the synthetic network (see benchmarks.network_generator) are generated before the timer.
+
+Run from the root of the project:
+    python -m benchmarks.validators_benchmark --rows 100000 --type-error-rate 0.01 --format-error-rate 0.01
+"""
+import argparse
+import re
+import timeit
+
+from benchmarks.network_generator import generate_network, add_network_arguments, network_options
+from utils.processors import DatabaseProcessor
+
+ROWS = 100_000
+REPEAT = 5
+
+
+def inline_validation(database):
+    """Type and format checks of the baseline: patterns are compiled for every field and every call."""
+    correct_data_type = dict(bus_id=int, stop_id=int, stop_name=str, next_stop=int, stop_type=str, a_time=str)
+    required_fields = ("stop_name", 'a_time')
+    type_errors = dict.fromkeys(correct_data_type, 0)
+    for stop in database:
+        for key, value in stop.items():
+            if type(value) != correct_data_type[key]:
+                type_errors[key] += 1
+                continue
+            stop_type_regex = re.compile(r"^.?$", re.VERBOSE)
+            if key == "stop_type" and not stop_type_regex.match(value):
+                type_errors[key] += 1
+            if key in required_fields and value == "":
+                type_errors[key] += 1
+    format_errors = dict(stop_name=0, stop_type=0, a_time=0)
+    validation_fields = {"stop_name": re.compile(r"^([A-Z]\w+\s)+(Road|Avenue|Boulevard|Street)$"),
+                         "stop_type": re.compile(r"^[SOF]?$"),
+                         "a_time": re.compile(r"^([01]\d|2[0-3])(:)([0-5]\d)$")}
+    for stop in database:
+        for key, value in stop.items():
+            if key in validation_fields and not validation_fields[key].match(value):
+                format_errors[key] += 1
+    return type_errors, format_errors
+
+
+def processor_validation(database):
+    """Type and format checks of the shipped code, _count_stop_errors of every record."""
+    processor = DatabaseProcessor([])
+    count_stop_errors = processor._count_stop_errors
+    for index, stop in enumerate(database):
+        count_stop_errors(stop, 1, index)
+    return processor._type_errors, processor._format_errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=ROWS)
+    add_network_arguments(parser)
+    parser.set_defaults(type_error_rate=0.01, format_error_rate=0.01)
+    args = parser.parse_args()
+    options = network_options(args)
+    database = list(generate_network(max(1, args.rows // options["stops_per_line"]), **options))
+    for func in (inline_validation, processor_validation):
+        best = min(timeit.repeat(lambda: func(database), repeat=REPEAT, number=1))
+        print(f"{func.__name__}: {best / len(database) * 1e9:.0f} ns per record")
+    print("errors agree:", inline_validation(database) == processor_validation(database))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,194 @@
 import argparse
 import logging
-import logging.handlers
+import os
+import sys
+import time
+from contextlib import nullcontext
 
-from utils.processor_handler import input_database_file, input_database_str
+from utils.processor_handler import input_database_file, input_database_str, iter_database_file, JSON_DECODERS
+from utils.processor_handler import expand_database_paths
 from utils.processors import DatabaseProcessor
 from utils.processor_errors import ProcessorError
+# the cache, results, error details, profiling and watching are imported by the functions which use them,
+# so the modules of the features which aren't chosen aren't imported
 
 
-def init_logger(name):
+LOG_FILE = "logs/easyraider.log"
+
+
+def init_logger(name, log_file: str = LOG_FILE, use_queue: bool = False):
+    """
+    Configures the logger, it is called from main(), so importing the module doesn't touch the file system.
+
+    :param name: name of the logger.
+    :param log_file: path to the log file, it is opened on the first record. Empty string disables the file.
+    :param use_queue: handlers are called by QueueListener in the background thread.
+    :return: started QueueListener, which must be stopped at the end, or None.
+    """
     logger = logging.getLogger(name)
     FORMAT = '%(asctime)s - %(name)s:%(lineno)s - %(levelname)s - %(message)s'
     logger.setLevel(logging.DEBUG)
     sh = logging.StreamHandler()
     sh.setFormatter(logging.Formatter(FORMAT))
     sh.setLevel(logging.DEBUG)
-    fh = logging.FileHandler(filename="logs/easyraider.log")
-    fh.setFormatter(logging.Formatter(FORMAT))
-    fh.setLevel(logging.INFO)
-    logger.addHandler(sh)
-    logger.addHandler(fh)
+    handlers = [sh]
+    if log_file:
+        os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+        fh = logging.FileHandler(filename=log_file, delay=True)
+        fh.setFormatter(logging.Formatter(FORMAT))
+        fh.setLevel(logging.INFO)
+        handlers.append(fh)
+    listener = None
+    if use_queue:
+        from logging.handlers import QueueHandler, QueueListener
+        from queue import SimpleQueue
+        log_queue = SimpleQueue()
+        listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        handlers = [QueueHandler(log_queue)]
+    for handler in handlers:
+        logger.addHandler(handler)
     logger.debug("logger was initialized")
+    return listener
 
 
-init_logger("app")
 logger = logging.getLogger("app.easyraider")
 
 
-def main():
-    # available actions
+def load_processor(args, cache: "ResultCache" = None) -> DatabaseProcessor:
+    """
+    Creates DatabaseProcessor for the input test_data. If there is the cache, results of the same file content
+    are restored without reading the file, results of the previous version of the file are updated
+    only for the changed records.
+    """
+    options = dict(workers=args.workers, arrival_time_backend=args.arrival_time_backend,
+                   error_details=args.error_details, max_errors=args.max_errors, profiler=args.profiler,
+                   bus_ids=args.bus_id, a_time_range=args.time_window, transfer_index=args.transfer_index,
+                   transfer_memory=args.transfer_memory << 20)
+    if args.snapshot:
+        db_bus_company = DatabaseProcessor.load_snapshot(args.snapshot, **options)
+        logger.info(f"Snapshot {args.snapshot} was loaded.")
+        return db_bus_company
+    if args.file_names and len(args.file_names) > 1:
+        if args.error_details is not None:
+            raise ProcessorError("Details of errors aren't collected for several files")
+        del options["error_details"]
+        db_bus_company = DatabaseProcessor.from_shards(args.file_names, json_decoder=args.json_decoder,
+                                                       stream=args.stream, **options)
+        logger.info(f"{len(args.file_names)} files of {args.file} were scanned.")
+        return db_bus_company
+    # results of the checks are cached without the test_data, it is read when it is printed or exported
+    if cache is not None and "print_info" not in args.verification and not args.export_snapshot:
+        results = cache.get(args.file_hash)
+        if results is not None:
+            db_bus_company = DatabaseProcessor([], **options)
+            db_bus_company.restore_stage_results(results)
+            logger.info(f"Results of the file {args.file} were restored from the cache.")
+            return db_bus_company
+    # input test_data
+    if args.file and args.stream:
+        database_dict = iter_database_file(args.file)
+        if args.profiler is not None:
+            database_dict = args.profiler.iterate("iter_database_file", database_dict)
+        logger.info(f"File {args.file} is streamed.")
+    elif args.file and args.profiler is not None:
+        with args.profiler.stage("input_database_file") as stats:
+            database_dict = input_database_file(args.file, args.json_decoder, args.mmap)
+            stats["records"] = len(database_dict)
+        logger.info(f"File {args.file} was uploaded.")
+    elif args.file:
+        database_dict = input_database_file(args.file, args.json_decoder, args.mmap)
+        logger.info(f"File {args.file} was uploaded.")
+    else:
+        database_dict = input_database_str(args.json_decoder)
+        logger.info('Console input.')
+    db_bus_company = DatabaseProcessor(database_dict, **options)
+    if cache is not None and not args.stream:
+        results = cache.get(f"records:{os.path.abspath(args.file)}")
+        if results is not None:
+            db_bus_company.restore_results(results)
+            db_bus_company.update_database(database_dict)
+            logger.info(f"Results of the previous version of the file {args.file} were updated.")
+    return db_bus_company
+
+
+def reload_processor(args, db_bus_company: DatabaseProcessor) -> None:
+    """
+    Passes the new version of the file to the processor. Only the changed records and their lines are checked
+    again if the test_data can be changed, otherwise it is checked from scratch.
+    """
+    database = input_database_file(args.file, args.json_decoder, args.mmap)
+    try:
+        db_bus_company.update_database(database)
+    except ProcessorError as e:
+        logger.debug(f"{e}, the file is checked again from scratch.")
+        db_bus_company.invalidate(database)
+
+
+def run_checks(args, actions: dict, checks: dict, verifications: set, db_bus_company: DatabaseProcessor,
+               output_file) -> None:
+    """Runs the chosen checks and prints or writes their results."""
+    from utils.processor_results import CheckError, write_json, write_ndjson
+    results = {}
+    for name, action in actions.items():
+        if name not in verifications:
+            continue
+        start = time.perf_counter()
+        try:
+            if args.output == "text":
+                action(db_bus_company)
+            else:
+                results[name] = checks[name](db_bus_company)
+        except ProcessorError as e:
+            logger.warning(e)
+            results[name] = CheckError(name, f"{type(e).__name__}: {e}")
+        # ndjson records are written as soon as the check is done
+        if args.output == "ndjson" and name in results:
+            write_ndjson({name: results.pop(name)}, output_file)
+        logger.info(f"The {name} has been run in {(time.perf_counter() - start) * 1000:.3f} ms.")
+    if args.output == "json":
+        write_json(results, output_file)
+
+
+def watch(args, actions: dict, checks: dict, verifications: set, db_bus_company: DatabaseProcessor,
+          output_file) -> None:
+    """Runs the checks again after every change of the file until the process is interrupted."""
+    from utils.processor_watch import watch_file
+    logger.info(f"Watching the file {args.file}...")
+    try:
+        for _ in watch_file(args.file, args.watch_interval, args.debounce):
+            start = time.perf_counter()
+            try:
+                reload_processor(args, db_bus_company)
+            except (OSError, ValueError) as e:
+                # the file may be written by parts, it is read again after the next change
+                logger.warning(f"File {args.file} can't be read: {e}")
+                continue
+            run_checks(args, actions, checks, verifications, db_bus_company, output_file)
+            output_file.flush()
+            logger.info(f"File {args.file} was checked again in {(time.perf_counter() - start) * 1000:.3f} ms.")
+    except KeyboardInterrupt:
+        logger.info("Watching was stopped.")
+
+
+def save_processor(args, cache: "ResultCache", db_bus_company: DatabaseProcessor) -> None:
+    """
+    Saves results of the checks to the cache by the file content. The test_data with its routes is saved
+    by the file path as the separate entry, it is read only when the file is changed, so the next version
+    is checked only for the changed records.
+    """
+    stage_results = db_bus_company.get_stage_results()
+    results = db_bus_company.get_results()
+    # streamed or restored test_data isn't kept
+    if results["_database"] is not None:
+        cache.put(f"records:{os.path.abspath(args.file)}", results)
+    # the small entry is written last, so it isn't evicted for the big one
+    cache.put(args.file_hash, stage_results)
+
+
+def main() -> int:
+    """Parses arguments, configures logging and runs the checks, see run()."""
+    # available actions, in order of their dependencies
     actions = {
         "data_type": DatabaseProcessor.print_data_type_errors,
         "format_fields": DatabaseProcessor.print_format_fields_errors,
@@ -35,37 +196,182 @@ def main():
         "stops_info": DatabaseProcessor.print_stops_info,
         "time_errors": DatabaseProcessor.print_arrival_time_errors,
         "demand_errors": DatabaseProcessor.print_demand_errors,
+        "error_details": DatabaseProcessor.print_error_details,
         "print_info": DatabaseProcessor.get_database
     }
+    # the same actions which return results instead of printing, for json and ndjson output
+    checks = {**DatabaseProcessor.CHECKS, "error_details": DatabaseProcessor.check_error_details,
+              "print_info": DatabaseProcessor.check_database}
 
     parser = argparse.ArgumentParser()
     parser.add_argument("-f", "--file", default=None,
                         help="Enter the path to the .json file with the test_data "
-                             "otherwise it will be entered json-string through the console.")
-    parser.add_argument("-v", "--verification", choices=actions.keys(),
-                        help="Choice type of verification.")
+                             "otherwise it will be entered json-string through the console. "
+                             "Directory or glob pattern of several files is checked as one test_data, "
+                             "files are scanned in parallel by --workers.")
+    parser.add_argument("--snapshot", default=None, metavar="FILE",
+                        help="Load the validated test_data and results of the checks from the binary snapshot "
+                             "instead of the .json file, see --export-snapshot.")
+    parser.add_argument("--export-snapshot", default=None, metavar="FILE",
+                        help="Write the test_data which passes all checks with their results to the binary snapshot, "
+                             "which is loaded without parsing.")
+    parser.add_argument("-s", "--stream", action="store_true",
+                        help="Read the .json file stop by stop instead of loading it in the memory.")
+    parser.add_argument("-j", "--json-decoder", choices=JSON_DECODERS, default="auto",
+                        help="Json parser of the file, 'auto' picks orjson or ujson if they are installed.")
+    parser.add_argument("--mmap", action="store_true",
+                        help="Map the .json file in the memory instead of reading it.")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Number of processes for checks of the routes.")
+    parser.add_argument("-b", "--arrival-time-backend", choices=DatabaseProcessor.ARRIVAL_TIME_BACKENDS,
+                        default="auto", help="Implementation of the arrival time check.")
+    parser.add_argument("-c", "--cache", default=None,
+                        help="Directory of the cache of results, the same file isn't processed twice.")
+    parser.add_argument("--cache-size", type=int, default=256,
+                        help="Max size of the cache in megabytes.")
+    parser.add_argument("-v", "--verification", choices=[*actions.keys(), "all"], nargs="+",
+                        help="Choice types of verification, "
+                             "'all' runs every check except error_details and print_info.")
+    parser.add_argument("-o", "--output", choices=("text", "json", "ndjson"), default="text",
+                        help="Format of the results.")
+    parser.add_argument("--output-file", default=None,
+                        help="File for json or ndjson results, they are written to the console by default.")
+    parser.add_argument("--error-details", type=int, default=1000, metavar="LIMIT",
+                        help="Max number of errors shown by error_details, a random sample is shown if there are more.")
+    parser.add_argument("--error-details-file", default=None,
+                        help="File for details of all errors as json lines, they aren't limited.")
+    parser.add_argument("--bus-id", type=int, nargs="+", default=None,
+                        help="Check only these lines, transfer stops are still found across all lines.")
+    parser.add_argument("--time-window", nargs=2, default=None, metavar=("START", "END"),
+                        help="Check only stops arriving from START to END in 'hh:mm' format, e.g. 07:00 10:00.")
+    parser.add_argument("--transfer-index", choices=DatabaseProcessor.TRANSFER_INDEXES, default="sets",
+                        help="Index of transfer stops: 'sets' of lines of every stop, 'compact' integer counters "
+                             "of the interned stops or 'sketch', a probabilistic pre-screen confirmed exactly.")
+    parser.add_argument("--transfer-memory", type=int, default=1,
+                        help="Size of the sketch of --transfer-index sketch in megabytes.")
+    parser.add_argument("--max-errors", type=int, default=None,
+                        help="Stop reading the test_data as soon as there are more type and format errors.")
+    parser.add_argument("--fail-fast", dest="max_errors", action="store_const", const=0,
+                        help="Stop reading the test_data on the first error, the same as --max-errors 0.")
+    parser.add_argument("--timing", action="store_true",
+                        help="Log wall time, CPU time and records per second of every stage.")
+    parser.add_argument("--profile", default=None, metavar="FILE",
+                        help="Profile the run by cProfile and tracemalloc, stats are dumped to the FILE "
+                             "and the summary to the FILE.txt, stages are logged with allocation peaks.")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and check the file again after every change, "
+                             "only the changed records and their lines are checked. Not allowed with --stream.")
+    parser.add_argument("--watch-interval", type=float, default=0.1,
+                        help="Seconds between polls of mtime and size of the watched file.")
+    parser.add_argument("--debounce", type=float, default=0.25,
+                        help="Seconds the watched file must stay unchanged before it is checked again.")
+    parser.add_argument("--serve", choices=("stdin", "http"), default=None,
+                        help="Run the validation service, which answers json payloads with results of all checks.")
+    parser.add_argument("--host", default="127.0.0.1", help="Host of the http validation service.")
+    parser.add_argument("--port", type=int, default=8080, help="Port of the http validation service.")
+    parser.add_argument("--log-file", default=LOG_FILE,
+                        help="File of the log, its directory is created if it doesn't exist, empty string disables it.")
+    parser.add_argument("--log-queue", action="store_true",
+                        help="Write the log in the background thread, so the checks don't wait for it.")
     args = parser.parse_args()
+    if not args.serve and not args.verification:
+        parser.error("the following arguments are required: -v/--verification")
+    if args.watch and args.stream:
+        # the streamed file is parsed by the checks, so a file which is being written would break them
+        parser.error("argument --watch: not allowed with argument -s/--stream")
+    listener = init_logger("app", args.log_file, args.log_queue)
+    logger.debug("Start processing...")
+    try:
+        return run(args, actions, checks)
+    finally:
+        logger.debug("End processing...")
+        if listener is not None:
+            listener.stop()
 
+
+def run(args, actions: dict, checks: dict) -> int:
+    """Runs the service or the chosen checks, returns 1 if the error budget was exceeded, otherwise 0."""
+    if args.serve:
+        import asyncio
+        from utils.processor_service import ValidationService, serve_stdin, serve_http
+        service = ValidationService()
+        try:
+            asyncio.run(serve_stdin(service) if args.serve == "stdin" else serve_http(service, args.host, args.port))
+        except KeyboardInterrupt:
+            logger.info("Validation service was stopped.")
+        return 0
+    exit_code = 0
+    args.profiler = None
+    profiling = nullcontext()
+    if args.timing or args.profile:
+        from utils.processor_profiling import StageProfiler, profile
+        args.profiler = StageProfiler(trace_memory=bool(args.profile))
+        if args.profile:
+            profiling = profile(args.profile)
+    # details of errors are collected during the scan, so they aren't restored from the cache
+    collect_details = "error_details" in args.verification or args.error_details_file
+    if collect_details:
+        from utils.processor_details import ErrorDetails
+        args.error_details = ErrorDetails(args.error_details, args.error_details_file)
+    else:
+        args.error_details = None
     try:
-        # input test_data
-        if args.file:
-            database_dict = input_database_file(args.file)
-            logger.info(f"File {args.file} was uploaded.")
-        else:
-            database_dict = input_database_str()
-            logger.info('Console input.')
-        # process test_data
-        db_bus_company = DatabaseProcessor(database_dict)
-        action = actions[args.verification]
-        action(db_bus_company)
-        logger.info(f"The {args.verification} has been run.")
+        with profiling:
+            args.file_names = expand_database_paths(args.file) if args.file else None
+            if args.file_names and len(args.file_names) == 1:
+                # the directory or pattern which matches one file is checked as this file
+                args.file = args.file_names[0]
+            if args.watch and args.file_names != [args.file]:
+                raise ProcessorError("Only one .json file can be watched")
+            # results of the filtered test_data aren't cached, compact indexes of transfer stops can't be updated,
+            # the error budget is checked by the scan, restored results of the full scan would pass it
+            filtered = args.bus_id is not None or args.time_window is not None
+            use_cache = args.cache and args.file_names == [args.file] and not collect_details and not filtered \
+                and args.transfer_index == "sets" and args.max_errors is None
+            cache = None
+            args.file_hash = None
+            if use_cache:
+                from utils.processor_cache import ResultCache, file_hash
+                cache = ResultCache(args.cache, args.cache_size << 20)
+                # the content is hashed once, before it is read, so results aren't saved for the later content
+                args.file_hash = file_hash(args.file)
+            # process test_data, checks share one processor and reuse results of each other
+            db_bus_company = load_processor(args, cache)
+            verifications = set(args.verification)
+            if "all" in verifications:
+                verifications.update(action for action in actions if action not in ("error_details", "print_info"))
+            output_file = sys.stdout
+            if args.output != "text" and args.output_file:
+                output_file = open(args.output_file, "w")
+            try:
+                run_checks(args, actions, checks, verifications, db_bus_company, output_file)
+                if args.watch:
+                    watch(args, actions, checks, verifications, db_bus_company, output_file)
+            finally:
+                if output_file is not sys.stdout:
+                    output_file.close()
+            if args.export_snapshot:
+                db_bus_company.export_snapshot(args.export_snapshot)
+                logger.info(f"Snapshot {args.export_snapshot} was written.")
+            stopped_at = db_bus_company.get_stopped_at()
+            if stopped_at is not None:
+                logger.warning(f"Reading was stopped after {stopped_at} records, "
+                               f"there are more than {args.max_errors} errors.")
+                exit_code = 1
+            # partial results of the stopped scan aren't cached, the watched file may be changed after the last check
+            elif cache is not None and not args.watch:
+                save_processor(args, cache, db_bus_company)
     except ProcessorError as e:
         logger.warning(e)
     except Exception as e:
         logger.error(e)
+    finally:
+        if args.error_details is not None:
+            args.error_details.close()
+        if args.profiler is not None:
+            args.profiler.log()
+    return exit_code
 
 
 if __name__ == "__main__":
-    logger.debug("Start processing...")
-    main()
-    logger.debug("End processing...")
+    sys.exit(main())
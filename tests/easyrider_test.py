@@ -0,0 +1,38 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class EasyriderTest(TestCase):
+    """Test for the command line interface"""
+
+    @staticmethod
+    def _run(*arguments) -> dict:
+        """Runs easyrider.py with json output and returns the results."""
+        with TemporaryDirectory() as directory:
+            output_file = os.path.join(directory, "results.json")
+            subprocess.run([sys.executable, os.path.join(ROOT, "easyrider.py"), *arguments, "-o", "json",
+                            "--output-file", output_file, "--log-file", ""], check=True, capture_output=True)
+            with open(output_file) as file:
+                return json.load(file)
+
+    def test_directory_with_one_file(self):
+        """Check the directory or pattern which matches one file is checked as this file."""
+        expected = self._run("-f", "test_data/data_find_demand_errors.json", "-v", "all")
+        with TemporaryDirectory() as directory:
+            shutil.copy("test_data/data_find_demand_errors.json", directory)
+            for file in (directory, os.path.join(directory, "*.json")):
+                with self.subTest(file=file):
+                    self.assertDictEqual(self._run("-f", file, "-v", "all"), expected)
+                    self.assertDictEqual(self._run("-f", file, "-v", "all", "-c", os.path.join(directory, "cache")),
+                                         expected)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import os
+import pickle
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+from utils.processor_cache import ResultCache, file_hash
+from utils.processor_errors import ProcessorError
+from utils.processor_handler import input_database_file
+from utils.processors import DatabaseProcessor
+
+
+class ResultCacheTest(TestCase):
+    """Test for ResultCache"""
+
+    def test_get_and_put(self):
+        """Check saved value is returned and missing key returns None."""
+        with TemporaryDirectory() as tmp_dir:
+            cache = ResultCache(tmp_dir, 1 << 20)
+            cache.put("key", {"bus_id": 128})
+
+            self.assertDictEqual(cache.get("key"), {"bus_id": 128})
+            self.assertIsNone(cache.get("missing key"))
+
+    def test_eviction(self):
+        """Check least recently used entries are evicted when the cache is too big."""
+        with TemporaryDirectory() as tmp_dir:
+            value = "x" * 1000
+            entry_size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+            cache = ResultCache(tmp_dir, entry_size * 2)
+            cache.put("first", value)
+            cache.put("second", value)
+            # make "first" the most recently used entry
+            os.utime(cache._entry_path("second"), (0, 0))
+            cache.get("first")
+            cache.put("third", value)
+
+            self.assertIsNotNone(cache.get("first"))
+            self.assertIsNone(cache.get("second"))
+            self.assertIsNotNone(cache.get("third"))
+
+    def test_big_entry(self):
+        """Check the entry bigger than the cache isn't saved and the written entry isn't evicted."""
+        with TemporaryDirectory() as tmp_dir:
+            value = "x" * 1000
+            entry_size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+            cache = ResultCache(tmp_dir, entry_size + 10)
+            cache.put("small", "x")
+
+            self.assertFalse(cache.put("big", value * 2))
+            self.assertIsNone(cache.get("big"))
+            self.assertEqual(cache.get("small"), "x")
+            self.assertTrue(cache.put("first", value))
+            self.assertIsNotNone(cache.get("first"))
+            self.assertIsNone(cache.get("small"))
+
+    def test_processor_results(self):
+        """Check results of the processor restored from the cache aren't computed again."""
+        path = "test_data/data_find_demand_errors.json"
+        with TemporaryDirectory() as tmp_dir:
+            cache = ResultCache(tmp_dir, 1 << 20)
+            my_processor = DatabaseProcessor(input_database_file(path))
+            my_processor._check_demand_errors()
+            cache.put(file_hash(path), my_processor.get_results())
+
+            restored_processor = DatabaseProcessor([])
+            restored_processor.restore_results(cache.get(file_hash(path)))
+            restored_processor._scan_database = None
+            restored_processor._check_demand_errors()
+
+            self.assertSetEqual(restored_processor._demand_stops_errors, {'Sunset Boulevard', 'Elm Street'})
+            self.assertListEqual(list(restored_processor._bus_route_info.items()),
+                                 list(my_processor._bus_route_info.items()))
+
+    def test_processor_stage_results(self):
+        """Check results of all checks are restored without the test_data and aren't computed again."""
+        for path in ("test_data/data_find_demand_errors.json", "test_data/data_find_time_errors.json",
+                     "test_data/data_find_format_errors.json", "test_data/data_find_bus_type_errors.json",
+                     "test_data/data_find_transfer_stops.json"):
+            with self.subTest(path=path), TemporaryDirectory() as tmp_dir:
+                cache = ResultCache(tmp_dir, 1 << 20)
+                my_processor = DatabaseProcessor(input_database_file(path))
+                cache.put(file_hash(path), my_processor.get_stage_results())
+
+                restored_processor = DatabaseProcessor([])
+                restored_processor.restore_stage_results(cache.get(file_hash(path)))
+                restored_processor._scan_database = None
+                restored_processor._order_routes = None
+
+                self.assertEqual(restored_processor.validate(), my_processor.validate())
+                self.assertRaises(ProcessorError, restored_processor.add_records, [])
+
+
+if __name__ == "__main__":
+    main()
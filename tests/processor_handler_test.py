@@ -0,0 +1,87 @@
+import json
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+from utils.processor_handler import input_database_file, iter_database_file, get_json_decoder, JSON_DECODERS
+
+
+class ProcessorHandlerTest(TestCase):
+    """Test for processor_handler"""
+    TEST_DATA_DIR = "test_data"
+
+    def test_iter_database_file(self):
+        """Check streamed stops are the same as loaded ones, for any size of chunk."""
+        for file_name in sorted(os.listdir(self.TEST_DATA_DIR)):
+            path = os.path.join(self.TEST_DATA_DIR, file_name)
+            for chunk_size in (1, 7, 4096):
+                with self.subTest(file_name=file_name, chunk_size=chunk_size):
+                    self.assertListEqual(list(iter_database_file(path, chunk_size)), input_database_file(path))
+
+    def test_iter_database_file_with_empty_array(self):
+        """Check empty array doesn't yield stops."""
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "empty.json")
+            with open(path, "w") as json_file:
+                json_file.write(" [ ] ")
+            self.assertListEqual(list(iter_database_file(path)), [])
+
+    def test_iter_database_file_with_broken_file(self):
+        """Check truncated array and not an array raise JSONDecodeError."""
+        with TemporaryDirectory() as tmp_dir:
+            for content in ('[{"bus_id": 128}, {"bus_id"', '{"bus_id": 128}', '[{"bus_id": 128} {"bus_id": 256}]',
+                            '[,,{"bus_id": 128},,]', '[{"bus_id": 128},]', '[{"bus_id": 128}] []'):
+                path = os.path.join(tmp_dir, "broken.json")
+                with open(path, "w") as json_file:
+                    json_file.write(content)
+                with self.subTest(content=content):
+                    self.assertRaises(json.JSONDecodeError, list, iter_database_file(path, 4))
+
+    def test_iter_database_file_with_cut_number(self):
+        """Check the number cut by the end of the chunk is read whole."""
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "numbers.json")
+            with open(path, "w") as json_file:
+                json_file.write("[1.5, -2e+10, 128]")
+            for chunk_size in range(1, 8):
+                with self.subTest(chunk_size=chunk_size):
+                    self.assertListEqual(list(iter_database_file(path, chunk_size)), [1.5, -2e+10, 128])
+
+    def test_iter_database_file_error_position(self):
+        """Check the broken stop fails with its line and column in the file, not in the buffer."""
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "broken.json")
+            with open(path, "w") as json_file:
+                json_file.write('[\n{"bus_id": 128},\n  {"bus_id" 256},\n' + '{"bus_id": 512},\n' * 1000 + "]")
+            for chunk_size in (4, 16, 1 << 16):
+                with self.subTest(chunk_size=chunk_size):
+                    with self.assertRaises(json.JSONDecodeError) as error:
+                        list(iter_database_file(path, chunk_size))
+                    self.assertEqual((error.exception.lineno, error.exception.colno), (3, 13))
+                    self.assertEqual(error.exception.pos, 31)
+
+    def test_input_database_file_decoders(self):
+        """Check every installed decoder reads the same stops, with and without mmap."""
+        path = os.path.join(self.TEST_DATA_DIR, "data_find_demand_errors.json")
+        with open(path) as json_file:
+            expected = json.load(json_file)
+        for decoder in JSON_DECODERS:
+            try:
+                get_json_decoder(decoder)
+            except ImportError:
+                continue
+            for use_mmap in (False, True):
+                with self.subTest(decoder=decoder, use_mmap=use_mmap):
+                    self.assertListEqual(input_database_file(path, decoder, use_mmap), expected)
+
+    def test_get_json_decoder(self):
+        """Check stdlib is always available and unknown decoder raises ValueError."""
+        self.assertIs(get_json_decoder("json"), json.loads)
+        self.assertRaises(ValueError, get_json_decoder, "simplejson")
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "empty.json")
+            open(path, "w").close()
+            self.assertRaises(ValueError, input_database_file, path, "json", True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+from utils.processor_profiling import StageProfiler, profile
+from utils.processor_handler import input_database_file, iter_database_file
+from utils.processors import DatabaseProcessor
+
+
+class StageProfilerTest(TestCase):
+    """Test for StageProfiler"""
+    DATA_FILE = "test_data/data_find_demand_errors.json"
+
+    def test_stages(self):
+        """Check every computed stage is measured with the number of records."""
+        profiler = StageProfiler()
+        database = input_database_file(self.DATA_FILE)
+        DatabaseProcessor(database, profiler=profiler).validate()
+        report = {stats["stage"]: stats for stats in profiler.report()}
+
+        self.assertListEqual(list(report), ["_scan_database", "_order_routes", "_find_transfer_stops",
+                                            "_check_arrival_time_errors", "_check_demand_errors"])
+        self.assertEqual(report["_scan_database"]["calls"], 1)
+        self.assertEqual(report["_scan_database"]["records"], len(database))
+        self.assertIsNone(report["_scan_database"]["peak_memory"])
+
+    def test_iterate(self):
+        """Check reading of the streamed file is measured apart from the scan."""
+        profiler = StageProfiler()
+        records = profiler.iterate("iter_database_file", iter_database_file(self.DATA_FILE))
+        DatabaseProcessor(records, profiler=profiler).check_data_type()
+        report = {stats["stage"]: stats for stats in profiler.report()}
+
+        self.assertEqual(report["iter_database_file"]["records"], report["_scan_database"]["records"])
+        self.assertLess(report["iter_database_file"]["wall"], report["_scan_database"]["wall"])
+
+    def test_profile(self):
+        """Check profile() dumps stats and allocation peaks of the stages are measured inside of it."""
+        profiler = StageProfiler(trace_memory=True)
+        with TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, "run.prof")
+            with profile(file_name):
+                DatabaseProcessor(input_database_file(self.DATA_FILE), profiler=profiler).check_data_type()
+
+            self.assertTrue(os.path.getsize(file_name))
+            with open(file_name + ".txt") as report:
+                self.assertIn("_scan_database", report.read())
+        self.assertGreater(profiler.stages["_scan_database"]["peak_memory"], 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import json
+from io import StringIO
+from unittest import TestCase, main
+from utils.processor_handler import input_database_file
+from utils.processor_results import write_json, write_ndjson
+from utils.processors import DatabaseProcessor
+
+
+class ProcessorResultsTest(TestCase):
+    """Test for json and ndjson output of the results"""
+    DATA_FIND_TIME_ERRORS = input_database_file("test_data/data_find_time_errors.json")
+
+    def test_write_json(self):
+        """Check json output contains fields of all results."""
+        output = StringIO()
+        write_json(DatabaseProcessor(self.DATA_FIND_TIME_ERRORS).validate(), output)
+        results = json.loads(output.getvalue())
+
+        self.assertListEqual(results["time_errors"]["errors"], [[128, "Fifth Avenue"], [256, "Sunset Boulevard"]])
+        self.assertEqual(results["data_type"]["errors"], 0)
+        self.assertIn("error", results["demand_errors"])
+
+    def test_write_ndjson(self):
+        """Check ndjson output has the summary and a record for every error."""
+        output = StringIO()
+        write_ndjson(DatabaseProcessor(self.DATA_FIND_TIME_ERRORS).validate(), output)
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        time_errors = [record for record in records if record["check"] == "time_errors"]
+
+        self.assertListEqual(time_errors, [
+            dict(check="time_errors", errors=2),
+            dict(check="time_errors", bus_id=128, stop_name="Fifth Avenue"),
+            dict(check="time_errors", bus_id=256, stop_name="Sunset Boulevard"),
+        ])
+
+
+if __name__ == "__main__":
+    main()
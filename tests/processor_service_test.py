@@ -0,0 +1,87 @@
+import asyncio
+import io
+import json
+import tempfile
+from unittest import IsolatedAsyncioTestCase, main
+from unittest.mock import patch
+from utils import processor_service
+from utils.processor_service import ValidationService, validate_payload, serve_stdin
+
+
+class ValidationServiceTest(IsolatedAsyncioTestCase):
+    """Test for ValidationService"""
+    with open("test_data/data_find_time_errors.json") as json_file:
+        PAYLOAD = json_file.read()
+
+    async def asyncSetUp(self):
+        self.service = ValidationService(batch_delay=0.05)
+
+    async def asyncTearDown(self):
+        await self.service.close()
+
+    async def test_validate(self):
+        """Check results of the service are the same as results of the payload validation."""
+        results = await self.service.validate(self.PAYLOAD)
+
+        self.assertDictEqual(results, validate_payload(self.PAYLOAD))
+        self.assertListEqual(results["time_errors"]["errors"], [(128, "Fifth Avenue"), (256, "Sunset Boulevard")])
+
+    async def test_validate_invalid_payload(self):
+        """Check invalid payloads have error instead of results."""
+        for payload in ("[{", '{"bus_id": 128}'):
+            with self.subTest(payload=payload):
+                self.assertIn("error", await self.service.validate(payload))
+
+    async def test_batch(self):
+        """Check payloads which come at the same time are validated in one batch."""
+        payloads = [json.dumps(json.loads(self.PAYLOAD)[:length]) for length in range(1, 6)]
+        with patch.object(processor_service, "validate_batch", wraps=processor_service.validate_batch) as batch:
+            results = await asyncio.gather(*(self.service.validate(payload) for payload in payloads))
+
+        self.assertEqual(batch.call_count, 1)
+        self.assertListEqual(results, [validate_payload(payload) for payload in payloads])
+
+    async def test_serve_stdin_from_file(self):
+        """Check payloads are read from stdin redirected from a regular file."""
+        payloads = [self.PAYLOAD.replace("\n", ""), "[{"]
+        stdout = io.StringIO()
+        with tempfile.TemporaryFile("w+") as stdin:
+            stdin.write("\n".join(payloads) + "\n")
+            stdin.seek(0)
+            with patch("sys.stdin", stdin), patch("sys.stdout", stdout):
+                await serve_stdin(self.service)
+
+        answers = sorted((json.loads(line) for line in stdout.getvalue().splitlines()), key=lambda answer: answer["id"])
+        self.assertListEqual([answer["id"] for answer in answers], [0, 1])
+        self.assertDictEqual(answers[0]["results"], json.loads(json.dumps(validate_payload(payloads[0]))))
+        self.assertIn("error", answers[1]["results"])
+
+    async def test_serve_stdin_in_flight(self):
+        """Check stdin isn't read further while max_in_flight payloads aren't answered."""
+        validate = self.service.validate
+        in_flight = max_in_flight = 0
+
+        async def counting_validate(payload):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            try:
+                return await validate(payload)
+            finally:
+                in_flight -= 1
+
+        stdout = io.StringIO()
+        with tempfile.TemporaryFile("w+") as stdin:
+            stdin.write("\n".join([self.PAYLOAD.replace("\n", "")] * 8 + ["[{"] * 8) + "\n")
+            stdin.seek(0)
+            with patch("sys.stdin", stdin), patch("sys.stdout", stdout), \
+                    patch.object(self.service, "validate", counting_validate):
+                await serve_stdin(self.service, max_in_flight=3)
+
+        self.assertListEqual(sorted(json.loads(line)["id"] for line in stdout.getvalue().splitlines()),
+                             list(range(16)))
+        self.assertEqual(max_in_flight, 3)
+
+
+if __name__ == "__main__":
+    main()
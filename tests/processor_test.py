@@ -1,8 +1,18 @@
-from unittest import TestCase, main
+import json
+import os
+import random
+import tempfile
+from unittest import TestCase, main, skipIf
+from unittest.mock import patch
 from utils.processors import DatabaseProcessor
-from utils.processor_errors import DataTypeProcessorError, ArrivalTimeProcessorError
-from utils.processor_errors import FormatFieldsProcessorError
-from utils.processor_handler import input_database_file
+from utils.processor_errors import DataTypeProcessorError, ArrivalTimeProcessorError, RouteProcessorError
+from utils.processor_errors import FormatFieldsProcessorError, SnapshotProcessorError
+from utils.processor_errors import ProcessorError
+from utils.processor_columns import StopColumns, has_numpy
+from utils.processor_transfer import LineSketch, find_transfer_stops_compact, find_transfer_stops_sketch
+from utils.processor_transfer import ONE_LINE, TRANSFER
+from utils.processor_handler import input_database_file, iter_database_file, expand_database_paths
+from utils.processor_details import ErrorDetails
 
 
 class DatabaseProcessorTest(TestCase):
@@ -39,6 +49,61 @@ class DatabaseProcessorTest(TestCase):
     DATA_CHECK_DEMAND_ERRORS_WITH_ARRIVAL_TIME_PROCESSOR_ERROR = input_database_file(
         "test_data/data_check_demand_errors_with_arrival_time_processor_error.json")
 
+    def test_scan_database_single_pass(self):
+        """Check that the whole chain of checks walks the database only once."""
+
+        class CountingDatabase(list):
+            passes = 0
+
+            def __iter__(self):
+                CountingDatabase.passes += 1
+                return super().__iter__()
+
+        my_processor = DatabaseProcessor(CountingDatabase(self.DATA_FIND_DEMAND_ERRORS))
+        my_processor._check_demand_errors()
+
+        self.assertSetEqual(my_processor._demand_stops_errors, {'Sunset Boulevard', 'Elm Street'})
+        self.assertEqual(CountingDatabase.passes, 1)
+
+    def test_streamed_database(self):
+        """Check DatabaseProcessor consumes iterator of stops."""
+        my_processor = DatabaseProcessor(iter_database_file("test_data/data_find_demand_errors.json"))
+        my_processor._check_demand_errors()
+
+        self.assertSetEqual(my_processor._demand_stops_errors, {'Sunset Boulevard', 'Elm Street'})
+        self.assertRaises(ProcessorError, my_processor.get_database)
+
+    def test_results_are_computed_once(self):
+        """Check repeated checks don't double-count errors on correct and broken test_data."""
+        my_processor = DatabaseProcessor(self.DATA_FIND_TIME_ERRORS)
+        my_processor._calculate_stops()
+        my_processor._check_format_fields()
+        my_processor._check_arrival_time_errors()
+        my_processor._check_arrival_time_errors()
+
+        self.assertEqual(my_processor._total_format_errors, 0)
+        self.assertListEqual(my_processor._arrival_time_errors, [(128, "Fifth Avenue"), (256, "Sunset Boulevard")])
+
+        my_processor = DatabaseProcessor(self.DATA_FIND_FORMAT_ERRORS)
+        my_processor._check_format_fields()
+        my_processor._check_format_fields()
+
+        self.assertEqual(my_processor._total_format_errors, 8)
+
+    def test_invalidate(self):
+        """Check DatabaseProcessor.invalidate() drops results of the previous test_data."""
+        my_processor = DatabaseProcessor(self.DATA_FIND_DEMAND_ERRORS)
+        my_processor._check_demand_errors()
+        my_processor.invalidate(self.DATA_FIND_DEMAND_ERRORS_WITH_CORRECT_DATA)
+        my_processor._check_demand_errors()
+
+        self.assertFalse(my_processor._demand_stops_errors)
+
+        my_processor.invalidate(self.DATA_FIND_FORMAT_ERRORS)
+
+        self.assertRaises(FormatFieldsProcessorError, my_processor._calculate_stops)
+        self.assertEqual(my_processor._total_format_errors, 8)
+
     def test_find_bus_type_errors(self):
         """Check add error in  'bus_id'"""
         my_processor = DatabaseProcessor(self.DATA_FIND_BUS_TYPE_ERRORS)
@@ -51,6 +116,23 @@ class DatabaseProcessorTest(TestCase):
         # self.assertEqual(my_processor.type_errors, my_processor.type_errors | right_dict)
         self.assertEqual(my_processor._total_type_errors, 9)
 
+    def test_out_of_range_int_type_errors(self):
+        """Check integers which don't fit in the 64-bit columns are type errors."""
+        database = [dict(stop) for stop in self.DATA_FIND_DEMAND_ERRORS]
+        database[0]["bus_id"] = 1 << 63
+        database[1]["stop_id"] = -(1 << 63) - 1
+        database[2]["next_stop"] = (1 << 63) - 1
+        my_processor = DatabaseProcessor(database)
+        my_processor.validate()
+
+        right_dict = dict(bus_id=1, stop_id=1, stop_name=0, next_stop=0, stop_type=0, a_time=0)
+
+        self.assertDictEqual(my_processor._type_errors, right_dict)
+        self.assertRaises(DataTypeProcessorError, my_processor._calculate_stops)
+
+        my_processor.update_record(3, dict(database[3], next_stop=1 << 64))
+        self.assertEqual(my_processor._type_errors["next_stop"], 1)
+
     def test_data_without_type_error(self):
         """Check 'bus_id' without errors."""
         my_processor = DatabaseProcessor(self.DATA_WITHOUT_TYPE_ERRORS)
@@ -101,6 +183,18 @@ class DatabaseProcessorTest(TestCase):
         self.assertDictContainsSubset(correct_error_dict, my_processor._format_errors)
         self.assertEqual(my_processor._total_format_errors, 3)
 
+    def test_trailing_newline_is_format_error(self):
+        """Check values with a trailing newline don't pass the format checks and don't break the scan"""
+        database = [dict(stop) for stop in self.DATA_FIND_DEMAND_ERRORS]
+        database[0]["stop_type"] = "S\n"
+        database[1]["a_time"] = "08:19\n"
+        database[2]["stop_name"] = "Fifth Avenue\n"
+        my_processor = DatabaseProcessor(database)
+        results = my_processor.validate()
+
+        self.assertEqual(results["data_type"].errors, 1)
+        self.assertDictContainsSubset(dict(stop_name=1, a_time=1), my_processor._format_errors)
+
     def test_find_format_errors(self):
         """Check complex errors"""
         my_processor = DatabaseProcessor(self.DATA_FIND_FORMAT_ERRORS)
@@ -153,6 +247,41 @@ class DatabaseProcessorTest(TestCase):
 
         self.assertDictContainsSubset(correct_bus_route_info, my_processor._bus_route_info)
 
+    def test_columns(self):
+        """Checking rows of _columns are the same as input test_data."""
+        my_processor = DatabaseProcessor(self.DATA_CALCULATE_STOPS)
+        my_processor._calculate_stops()
+        columns = my_processor._columns
+
+        self.assertListEqual([columns.record(row) for row in range(len(columns))], self.DATA_CALCULATE_STOPS)
+
+    def test_calculate_stops_with_shuffled_stops(self):
+        """Checking stops of _bus_route_info are ordered by next_stop links."""
+        my_processor = DatabaseProcessor(self.DATA_CALCULATE_STOPS[::-1])
+        my_processor._calculate_stops()
+
+        self.assertListEqual(list(my_processor._bus_route_info[128]["stops"]), [
+            ("Prospekt Avenue", "08:12"), ("Elm Street", "08:19"), ("Fifth Avenue", "08:25"), ("Sesame Street", "08:37")
+        ])
+
+    def test_calculate_stops_with_route_processor_error(self):
+        """Checking DatabaseProcessor._calculate_stops with broken next_stop links."""
+        broken_links = {
+            "duplicate stop_id 1": [(1, 3), (3, 1), (1, 0)],
+            "stop_id 3 links to missing stop 7": [(1, 3), (3, 7), (5, 0)],
+            "route is a cycle": [(1, 3), (3, 5), (5, 1)],
+            "stop_id 3 is linked by several stops": [(1, 3), (3, 5), (5, 3)],
+            "route is split into fragments starting with stop_id [1, 5]": [(1, 3), (3, 0), (5, 7), (7, 0)],
+            "route contains a cycle, which isn't linked to the first stop": [(1, 0), (3, 5), (5, 3)],
+        }
+        for error, links in broken_links.items():
+            database = [dict(bus_id=128, stop_id=stop_id, stop_name="Elm Street", next_stop=next_stop, stop_type="",
+                             a_time=f"08:{10 + stop_id}") for stop_id, next_stop in links]
+            my_processor = DatabaseProcessor(database)
+            with self.subTest(error=error):
+                self.assertRaises(RouteProcessorError, my_processor._calculate_stops)
+                self.assertListEqual(my_processor._route_errors, [(128, error)])
+
     def test_calculate_stops_with_data_type_processor_error_broken_bus_id(self):
         """Checking DatabaseProcessor._calculate_stops with broken type 'bus_id' """
         my_processor = DatabaseProcessor(self.DATA_CALCULATE_STOPS_WITH_DATA_TYPE_PROCESSOR_ERROR_BROKEN_BUS_ID)
@@ -174,6 +303,18 @@ class DatabaseProcessorTest(TestCase):
 
         self.assertListEqual(answer, correct_transfer_list)
 
+    def test_find_transfer_stops_with_repeated_stop(self):
+        """Check a stop passed twice by one line isn't a transfer stop."""
+        database = [
+            dict(bus_id=128, stop_id=1, stop_name="Elm Street", next_stop=3, stop_type="S", a_time="08:12"),
+            dict(bus_id=128, stop_id=3, stop_name="Fifth Avenue", next_stop=5, stop_type="", a_time="08:19"),
+            dict(bus_id=128, stop_id=5, stop_name="Elm Street", next_stop=0, stop_type="F", a_time="08:25"),
+        ]
+        my_processor = DatabaseProcessor(database)
+
+        self.assertListEqual(my_processor._find_transfer_stops(), [])
+        self.assertDictEqual(my_processor._stop_lines, {"Elm Street": {128}, "Fifth Avenue": {128}})
+
     def test_find_time_errors_with_correct_data(self):
         """Check DatabaseProcessor._arrival_time_errors with incorrect test_data."""
         my_processor = DatabaseProcessor(self.DATA_FIND_TIME_ERRORS_WITH_CORRECT_DATA)
@@ -203,6 +344,46 @@ class DatabaseProcessorTest(TestCase):
 
         self.assertListEqual(my_processor._arrival_time_errors, correct_error_list)
 
+    def test_find_time_errors_with_workers(self):
+        """Check DatabaseProcessor._arrival_time_errors in the pool of processes is the same as without it."""
+        my_processor = DatabaseProcessor(self.DATA_FIND_TIME_ERRORS, workers=2)
+        my_processor._check_arrival_time_errors()
+        correct_error_list = [(128, "Fifth Avenue"), (256, "Sunset Boulevard")]
+
+        self.assertListEqual(my_processor._arrival_time_errors, correct_error_list)
+
+    def test_find_time_errors_with_python_backend(self):
+        """Check DatabaseProcessor._arrival_time_errors with the loop over the stops."""
+        wrong_time = [(128, "Fifth Avenue"), (256, "Sunset Boulevard")]
+        for data, correct_error_list in ((self.DATA_FIND_TIME_ERRORS, wrong_time),
+                                         (self.DATA_FIND_TIME_ERRORS_WITH_CORRECT_DATA, [])):
+            my_processor = DatabaseProcessor(data, arrival_time_backend="python")
+            my_processor._check_arrival_time_errors()
+
+            self.assertListEqual(my_processor._arrival_time_errors, correct_error_list)
+
+    @skipIf(not has_numpy(), "numpy isn't installed")
+    def test_find_time_errors_with_numpy_backend(self):
+        """Check DatabaseProcessor._arrival_time_errors with the vectorized check."""
+        wrong_time = [(128, "Fifth Avenue"), (256, "Sunset Boulevard")]
+        for data, correct_error_list in ((self.DATA_FIND_TIME_ERRORS, wrong_time),
+                                         (self.DATA_FIND_TIME_ERRORS_WITH_CORRECT_DATA, [])):
+            my_processor = DatabaseProcessor(data, arrival_time_backend="numpy")
+            my_processor._check_arrival_time_errors()
+
+            self.assertListEqual(my_processor._arrival_time_errors, correct_error_list)
+
+    def test_auto_arrival_time_backend(self):
+        """Check "auto" picks numpy only for the test_data which is big enough to pay off its import."""
+        my_processor = DatabaseProcessor(self.DATA_FIND_TIME_ERRORS)
+        my_processor._calculate_stops()
+        self.assertEqual(my_processor._choose_arrival_time_backend(), "python")
+
+        with patch("utils.processors.NUMPY_MIN_ROWS", 0), patch("utils.processors.NUMPY_IMPORT_MIN_ROWS", 0):
+            self.assertEqual(my_processor._choose_arrival_time_backend(), "numpy" if has_numpy() else "python")
+            self.assertEqual(DatabaseProcessor(self.DATA_FIND_TIME_ERRORS, workers=2)._choose_arrival_time_backend(),
+                             "python")
+
     def test_find_demand_errors_with_correct_data(self):
         """Check DatabaseProcessor._check_demand_errors() with correct test_data."""
         my_processor = DatabaseProcessor(self.DATA_FIND_DEMAND_ERRORS_WITH_CORRECT_DATA)
@@ -237,5 +418,329 @@ class DatabaseProcessorTest(TestCase):
         self.assertRaises(ArrivalTimeProcessorError, my_processor._check_demand_errors)
 
 
+    def test_validate(self):
+        """Check DatabaseProcessor.validate() returns results of all checks."""
+        results = DatabaseProcessor(self.DATA_FIND_TIME_ERRORS).validate()
+
+        self.assertListEqual(results["bus_info"].lines, [(128, 4), (256, 4), (512, 2)])
+        self.assertListEqual(results["time_errors"].errors, [(128, "Fifth Avenue"), (256, "Sunset Boulevard")])
+        self.assertTrue(results["demand_errors"].error.startswith("ArrivalTimeProcessorError"))
+
+    def test_error_details(self):
+        """Check details of errors are limited, but the numbers of errors are exact."""
+        database = [dict(stop, a_time="7:00") for stop in self.DATA_FIND_DEMAND_ERRORS] * 50
+        all_details = ErrorDetails(limit=len(database))
+        DatabaseProcessor(database, error_details=all_details).check_error_details()
+        error_details = ErrorDetails(limit=10, seed=1)
+        result = DatabaseProcessor(database, error_details=error_details).check_error_details()
+
+        self.assertEqual(result.format_errors, len(database))
+        self.assertEqual(error_details.seen, len(database))
+        self.assertEqual(len(result.details), 10)
+        self.assertTrue(set(result.details) <= set(all_details.samples))
+        self.assertListEqual(result.details, sorted(result.details, key=lambda detail: detail[0]))
+        # the sample isn't just the first errors
+        self.assertGreater(result.details[-1][0], 10)
+
+    def test_error_details_spill_file(self):
+        """Check all errors are written to the spill file and details follow changes of the records."""
+        with tempfile.TemporaryDirectory() as directory:
+            spill_file = os.path.join(directory, "errors.ndjson")
+            error_details = ErrorDetails(limit=1, spill_file=spill_file)
+            database = [dict(stop) for stop in self.DATA_FIND_BUS_TYPE_ERRORS]
+            my_processor = DatabaseProcessor(database, error_details=error_details)
+            result = my_processor.check_error_details()
+            error_details.flush()
+            with open(spill_file) as file:
+                spilled = [json.loads(line) for line in file]
+            index = result.details[0][0]
+            my_processor.update_record(index, dict(self.DATA_FIND_DEMAND_ERRORS[0]))
+            updated_result = my_processor.check_error_details()
+            error_details.close()
+            with open(spill_file) as file:
+                updated_spilled = [json.loads(line) for line in file]
+
+        self.assertEqual(len(spilled), result.type_errors + result.format_errors)
+        self.assertTrue(all(detail[0] != index for detail in updated_result.details))
+        # the spill file and the number of errors follow the changed record
+        self.assertListEqual(updated_spilled, [detail for detail in spilled if detail["index"] != index])
+        self.assertEqual(error_details.seen, updated_result.type_errors + updated_result.format_errors)
+        self.assertRaises(ProcessorError, DatabaseProcessor(database).check_error_details)
+
+    def test_max_errors(self):
+        """Check the scan stops as soon as the error budget is exceeded and reports how far it got."""
+        database = [dict(stop) for stop in self.DATA_FIND_DEMAND_ERRORS]
+        database[3]["bus_id"] = "128"
+        database.extend(dict(stop, a_time="7:00") for stop in self.DATA_FIND_DEMAND_ERRORS)
+        records = iter(database)
+        my_processor = DatabaseProcessor(records, max_errors=0)
+        result = my_processor.check_data_type()
+
+        self.assertEqual(result.stopped_at, 4)
+        self.assertEqual(result.errors, 1)
+        self.assertRaises(DataTypeProcessorError, my_processor.check_bus_info)
+        # the rest of the streamed test_data isn't read
+        self.assertEqual(len(list(records)), len(database) - 4)
+
+        my_processor = DatabaseProcessor(database, max_errors=len(self.DATA_FIND_DEMAND_ERRORS))
+        self.assertEqual(my_processor.check_data_type().stopped_at, 2 * len(self.DATA_FIND_DEMAND_ERRORS))
+        self.assertRaises(ProcessorError, my_processor.remove_record, 0)
+
+        my_processor = DatabaseProcessor(database, max_errors=len(database) + 1)
+        self.assertIsNone(my_processor.check_data_type().stopped_at)
+        self.assertEqual(my_processor._total_format_errors, len(self.DATA_FIND_DEMAND_ERRORS))
+
+    def test_from_shards(self):
+        """Check results of the test_data split into files are the same as results of one file."""
+        for data in (self.DATA_FIND_DEMAND_ERRORS, self.DATA_FIND_TIME_ERRORS, self.DATA_FIND_BUS_TYPE_ERRORS,
+                     self.DATA_FIND_TRANSFER_STOPS):
+            expected = DatabaseProcessor(data).validate()
+            with tempfile.TemporaryDirectory() as directory:
+                # lines are split between the files
+                for shard, start in enumerate(range(0, len(data), 3)):
+                    with open(os.path.join(directory, f"depot{shard}.json"), "w") as file:
+                        json.dump(data[start:start + 3], file)
+                file_names = expand_database_paths(directory)
+                self.assertListEqual(file_names, expand_database_paths(os.path.join(directory, "depot*.json")))
+                for workers, stream in ((1, False), (2, False), (2, True)):
+                    with self.subTest(workers=workers, stream=stream):
+                        my_processor = DatabaseProcessor.from_shards(file_names, workers, stream=stream)
+                        self.assertDictEqual(my_processor.validate(), expected)
+
+    def test_from_shards_with_max_errors(self):
+        """Check files after the one which exceeded the error budget are dropped."""
+        with tempfile.TemporaryDirectory() as directory:
+            file_names = []
+            for shard, data in enumerate((self.DATA_FIND_DEMAND_ERRORS, self.DATA_FIND_BUS_TYPE_ERRORS,
+                                          self.DATA_FIND_DEMAND_ERRORS)):
+                file_names.append(os.path.join(directory, f"depot{shard}.json"))
+                with open(file_names[-1], "w") as file:
+                    json.dump(data, file)
+            result = DatabaseProcessor.from_shards(file_names, max_errors=0).check_data_type()
+
+        self.assertEqual(result.stopped_at, len(self.DATA_FIND_DEMAND_ERRORS) + 1)
+        self.assertEqual(result.errors, 1)
+
+    def test_bus_ids_filter(self):
+        """Check only chosen lines are checked, but transfer stops are found across all lines."""
+        database = [dict(stop) for stop in self.DATA_FIND_DEMAND_ERRORS]
+        # the skipped line isn't checked
+        database[-1]["bus_id"] = "512"
+        my_processor = DatabaseProcessor(database, bus_ids=[128])
+        results = my_processor.validate()
+
+        self.assertEqual(results["data_type"].errors, 0)
+        self.assertListEqual(results["bus_info"].lines, [(128, 4)])
+        self.assertListEqual(results["stops_info"].transfer, ["Elm Street", "Sesame Street"])
+        self.assertListEqual(results["stops_info"].start, ["Prospekt Avenue"])
+        self.assertListEqual(results["demand_errors"].errors, ["Elm Street"])
+        self.assertRaises(ProcessorError, my_processor.remove_record, 0)
+
+    def test_a_time_range_filter(self):
+        """Check only stops in the window are checked and routes cut by it aren't broken."""
+        results = DatabaseProcessor(iter(self.DATA_FIND_DEMAND_ERRORS), a_time_range=("08:15", "09:50")).validate()
+
+        self.assertListEqual(results["bus_info"].lines, [(128, 3), (256, 2), (512, 1)])
+        self.assertIsNone(results["stops_info"].line_without_start_or_finish)
+        self.assertListEqual(results["stops_info"].start, ["Pilotow Street"])
+        self.assertListEqual(results["stops_info"].transfer, ["Elm Street", "Sesame Street", "Sunset Boulevard"])
+        self.assertListEqual(results["stops_info"].finish, ["Sesame Street", "Sunset Boulevard"])
+        self.assertListEqual(results["time_errors"].errors, [])
+        self.assertListEqual(results["demand_errors"].errors, ["Elm Street"])
+
+        with tempfile.TemporaryDirectory() as directory:
+            file_names = []
+            for shard, start in enumerate(range(0, len(self.DATA_FIND_DEMAND_ERRORS), 3)):
+                file_names.append(os.path.join(directory, f"depot{shard}.json"))
+                with open(file_names[-1], "w") as file:
+                    json.dump(self.DATA_FIND_DEMAND_ERRORS[start:start + 3], file)
+            my_processor = DatabaseProcessor.from_shards(file_names, 2, a_time_range=("08:15", "09:50"))
+            self.assertDictEqual(my_processor.validate(), results)
+
+    def test_transfer_indexes(self):
+        """Check compact and sketch indexes of transfer stops give the same results as sets of lines."""
+        expected = DatabaseProcessor(self.DATA_FIND_DEMAND_ERRORS).validate()
+        for transfer_index, transfer_memory in (("compact", 0), ("sketch", 1 << 10), ("sketch", 1)):
+            my_processor = DatabaseProcessor(self.DATA_FIND_DEMAND_ERRORS, transfer_index=transfer_index,
+                                             transfer_memory=transfer_memory)
+            self.assertDictEqual(my_processor.validate(), expected)
+            self.assertDictEqual(my_processor._stop_lines, {})
+            self.assertRaises(ProcessorError, my_processor.remove_record, 0)
+
+        # stops repeated on one line are no candidates, the sketch of one cell has too many candidates for compact
+        columns = StopColumns()
+        for bus_id, stop_name in ((128, "Elm Street"), (128, "Elm Street"), (128, "Sunset Boulevard"),
+                                  (256, "Sunset Boulevard"), (256, "Bourbon Street")):
+            columns.append({"bus_id": bus_id, "stop_id": 1, "stop_name": stop_name, "next_stop": 0,
+                            "stop_type": "", "a_time": "08:00"})
+        sketch = LineSketch(1 << 20)
+        for code, bus_id in zip(columns.stop_name, columns.bus_id):
+            sketch.add(code, bus_id)
+        self.assertListEqual([sketch.estimate(code) for code in range(3)], [ONE_LINE, TRANSFER, ONE_LINE])
+        with patch("utils.processor_transfer.find_transfer_stops_compact",
+                   wraps=find_transfer_stops_compact) as compact:
+            self.assertListEqual(find_transfer_stops_sketch(columns, 1 << 20), ["Sunset Boulevard"])
+            compact.assert_not_called()
+            self.assertListEqual(find_transfer_stops_sketch(columns, 9 * 4), ["Sunset Boulevard"])
+            compact.assert_called_once_with(columns)
+
+        self.assertRaises(ValueError, DatabaseProcessor, [], transfer_index="bloom")
+        self.assertRaises(ValueError, DatabaseProcessor, [], transfer_index="compact", bus_ids=[128])
+
+    def test_snapshot(self):
+        """Check the snapshot restores the test_data and results of all checks."""
+        database = [dict(stop) for stop in self.DATA_FIND_DEMAND_ERRORS]
+        my_processor = DatabaseProcessor(database)
+        my_processor.update_record(1, dict(database[1], next_stop=7))
+        my_processor.remove_record(2)
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "network.snapshot")
+            my_processor.export_snapshot(file_name)
+            snapshot = DatabaseProcessor.load_snapshot(file_name)
+
+            self.assertDictEqual(snapshot.validate(), my_processor.validate())
+            self.assertListEqual(list(snapshot.check_database().records), my_processor.check_database().records)
+            self.assertRaises(ProcessorError, snapshot.remove_record, 0)
+            # the test_data of the snapshot is checked again after invalidate()
+            snapshot.invalidate()
+            self.assertDictEqual(snapshot.validate(), my_processor.validate())
+
+            self.assertRaises(SnapshotProcessorError, DatabaseProcessor(self.DATA_FIND_TIME_ERRORS).export_snapshot,
+                              file_name)
+            with open(file_name, "w") as file:
+                json.dump(self.DATA_FIND_DEMAND_ERRORS, file)
+            self.assertRaises(SnapshotProcessorError, DatabaseProcessor.load_snapshot, file_name)
+
+    def test_snapshot_of_shards(self):
+        """Check the snapshot of the test_data split into files keeps its records."""
+        expected = DatabaseProcessor(self.DATA_FIND_DEMAND_ERRORS).validate()
+        with tempfile.TemporaryDirectory() as directory:
+            file_names = []
+            for shard, start in enumerate(range(0, len(self.DATA_FIND_DEMAND_ERRORS), 3)):
+                file_names.append(os.path.join(directory, f"depot{shard}.json"))
+                with open(file_names[-1], "w") as file:
+                    json.dump(self.DATA_FIND_DEMAND_ERRORS[start:start + 3], file)
+            file_name = os.path.join(directory, "network.snapshot")
+            for workers in (1, 2):
+                with self.subTest(workers=workers):
+                    DatabaseProcessor.from_shards(file_names, workers).export_snapshot(file_name)
+                    snapshot = DatabaseProcessor.load_snapshot(file_name)
+
+                    self.assertListEqual(list(snapshot.check_database().records), self.DATA_FIND_DEMAND_ERRORS)
+                    snapshot.invalidate()
+                    self.assertDictEqual(snapshot.validate(), expected)
+
+    @staticmethod
+    def _processor_state(my_processor) -> list:
+        """Runs all checks and returns their results."""
+        state = []
+        checks = (my_processor._check_data_type, my_processor._calculate_stops, my_processor._find_transfer_stops,
+                  my_processor._check_arrival_time_errors, my_processor._check_demand_errors)
+        for check in checks:
+            try:
+                state.append(check())
+            except ProcessorError as e:
+                state.append(type(e))
+        state.extend([my_processor._type_errors, my_processor._format_errors, list(my_processor._bus_route_info.items()),
+                      my_processor._stop_lines, my_processor._route_errors, my_processor._arrival_time_errors,
+                      my_processor._demand_stops_errors])
+        return state
+
+    def test_incremental_changes(self):
+        """Check state after add_records, update_record and remove_record is the same as after a full run."""
+        rnd = random.Random(0)
+        database = [dict(stop) for stop in self.DATA_FIND_DEMAND_ERRORS]
+        names = ["Elm Street", "Sesame Street", "Sunset Boulevard", "Bourbon Street", "Fifth Avenue"]
+        changes = [("stop_type", "O"), ("stop_type", ""), ("stop_type", "S"), ("stop_type", "F"),
+                   ("a_time", "07:00"), ("a_time", "08:15"), ("a_time", "23:59"), ("stop_name", "Sesame Street"),
+                   ("stop_name", "Elm Street")]
+        broken_changes = [("bus_id", "128"), ("a_time", "7:00"), ("bus_id", 128), ("bus_id", 256), ("next_stop", 0),
+                          ("next_stop", 5)]
+        my_processor = DatabaseProcessor(database)
+        for step in range(300):
+            indices = [index for index, stop in enumerate(database) if stop is not None]
+            action = rnd.random()
+            if action < 0.65 and indices:
+                index = rnd.choice(indices)
+                key, value = rnd.choice(changes)
+                my_processor.update_record(index, dict(database[index], **{key: value}))
+            elif action < 0.7 and indices:
+                # the record is broken for one check and restored then
+                index = rnd.choice(indices)
+                record = database[index]
+                key, value = rnd.choice(broken_changes)
+                my_processor.update_record(index, dict(record, **{key: value}))
+                full_processor = DatabaseProcessor([dict(stop) for stop in database if stop is not None])
+                self.assertEqual(self._processor_state(my_processor), self._processor_state(full_processor))
+                my_processor.update_record(index, record)
+            elif action < 0.85 and indices:
+                # the first stop of the line is removed, so the route stays linked
+                bus_id = database[rnd.choice(indices)]["bus_id"]
+                line = [index for index in indices if database[index]["bus_id"] == bus_id]
+                linked = {database[index]["next_stop"] for index in line}
+                my_processor.remove_record(next((index for index in line if database[index]["stop_id"] not in linked),
+                                                line[0]))
+            else:
+                my_processor.add_records([
+                    dict(bus_id=1000 + step, stop_id=stop_id, stop_name=rnd.choice(names), next_stop=(stop_id + 1) % 4,
+                         stop_type=stop_type, a_time=f"{9 + stop_id:02}:{rnd.randrange(60):02}")
+                    for stop_id, stop_type in ((1, "S"), (2, rnd.choice(["O", ""])), (3, "F"))])
+            if rnd.random() < 0.7:
+                full_processor = DatabaseProcessor([dict(stop) for stop in database if stop is not None])
+                with self.subTest(step=step):
+                    self.assertEqual(self._processor_state(my_processor), self._processor_state(full_processor))
+
+    def test_update_database(self):
+        """Check state after update_database is the same as after a full run with the new test_data."""
+        my_processor = DatabaseProcessor([dict(stop) for stop in self.DATA_FIND_DEMAND_ERRORS])
+        self._processor_state(my_processor)
+        for database in (self.DATA_FIND_TIME_ERRORS, self.DATA_FIND_DEMAND_ERRORS[:-3],
+                         self.DATA_FIND_DEMAND_ERRORS, self.DATA_FIND_FORMAT_ERRORS, self.DATA_FIND_TRANSFER_STOPS):
+            my_processor.update_database(database)
+            with self.subTest(database=database):
+                self.assertEqual(self._processor_state(my_processor),
+                                 self._processor_state(DatabaseProcessor(database)))
+
+    def test_update_database_shifted_records(self):
+        """Check inserted and removed records don't make the shifted records after them changed."""
+        database = [dict(stop) for stop in self.DATA_FIND_DEMAND_ERRORS]
+        my_processor = DatabaseProcessor(list(database), error_details=ErrorDetails())
+        self._processor_state(my_processor)
+        inserted = dict(database[1], stop_id=4, stop_name="Bourbon Street", next_stop=5, stop_type="")
+        broken = dict(database[4], a_time="9:20")
+        # new test_data and lines checked by every _order_routes() call
+        versions = ((database[:2] + [inserted] + database[2:], [[128]]), (database[1:], [[128]]),
+                    (database[:4] + database[5:], [[256], [128]]), (database[:4] + [broken] + database[5:], []),
+                    (database[:4] + [broken] + database[5:8] + database[9:], []))
+        for new_database, lines in versions:
+            with self.subTest(database=new_database), \
+                    patch.object(my_processor, "_order_routes", wraps=my_processor._order_routes) as order_routes:
+                my_processor.update_database(new_database)
+                full_processor = DatabaseProcessor(new_database, error_details=ErrorDetails())
+                self.assertEqual(self._processor_state(my_processor), self._processor_state(full_processor))
+                self.assertEqual(my_processor._error_details.samples, full_processor._error_details.samples)
+                self.assertEqual(order_routes.call_args_list, [((bus_ids,),) for bus_ids in lines])
+
+    def test_incremental_changes_reuse_rows(self):
+        """Check rows of the changed and removed records are reused, so the columns don't grow with edits."""
+        database = [dict(stop) for stop in self.DATA_FIND_DEMAND_ERRORS]
+        my_processor = DatabaseProcessor(database)
+        self._processor_state(my_processor)
+        for step in range(100):
+            my_processor.update_record(1, dict(database[1], a_time=f"08:{15 + step % 3}"))
+        my_processor.remove_record(5)
+        my_processor.add_records([dict(self.DATA_FIND_DEMAND_ERRORS[5])])
+
+        self.assertEqual(len(my_processor._columns), len(self.DATA_FIND_DEMAND_ERRORS))
+        self.assertEqual(self._processor_state(my_processor),
+                         self._processor_state(DatabaseProcessor([stop for stop in database if stop is not None])))
+
+    def test_incremental_changes_of_streamed_database(self):
+        """Check streamed test_data can't be changed."""
+        my_processor = DatabaseProcessor(iter(self.DATA_FIND_DEMAND_ERRORS))
+
+        self.assertRaises(ProcessorError, my_processor.add_records, [])
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,43 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+from utils.processor_watch import file_signature, watch_file
+
+
+class WatchFileTest(TestCase):
+    """Test for watch_file"""
+
+    def test_debounce(self):
+        """Check a burst of writes is yielded once, after the file stops changing."""
+        with TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "buses.json")
+            with open(file_name, "w") as file:
+                file.write("[]")
+            now = [0.0]
+            polls = [0]
+            # number of the poll -> content written before it
+            writes = {1: "[{}]", 2: "[{}, {}]", 3: "[{}, {}, {}]", 9: "[]"}
+
+            def sleep(seconds):
+                now[0] += seconds
+                polls[0] += 1
+                if polls[0] in writes:
+                    with open(file_name, "w") as file:
+                        file.write(writes[polls[0]])
+
+            changes = watch_file(file_name, interval=0.1, debounce=0.25, sleep=sleep, clock=lambda: now[0])
+
+            # the last write of the burst is at 0.3 s
+            self.assertEqual(next(changes), file_signature(file_name))
+            self.assertAlmostEqual(now[0], 0.6)
+            self.assertEqual(next(changes), file_signature(file_name))
+            self.assertAlmostEqual(now[0], 1.2)
+
+    def test_missing_file(self):
+        """Check the missing file has no signature."""
+        with TemporaryDirectory() as directory:
+            self.assertIsNone(file_signature(os.path.join(directory, "buses.json")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Persistent on-disk cache of DatabaseProcessor results.
+Every entry is a pickle file, entries which weren't used for the longest time are evicted
+when total size of the cache exceeds the limit.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+
+logger = logging.getLogger("app.utils.processor_cache")
+
+# must be changed when results of DatabaseProcessor get other structure
+CACHE_VERSION = 4
+CHUNK_SIZE = 1 << 20
+
+
+def file_hash(file_name: str) -> str:
+    """
+    Calculates hash of the file content, the file is read chunk by chunk.
+
+    :param file_name: Full path to the file.
+    :return: hex digest of the content.
+    """
+    digest = hashlib.sha256()
+    with open(file_name, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Size-bounded LRU cache of picklable values in the directory."""
+
+    def __init__(self, directory: str, max_size: int):
+        """
+        :param directory: directory of the cache, it is created if it doesn't exist.
+        :param max_size: max total size of entries in bytes.
+        """
+        self._directory = directory
+        self._max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry_path(self, key: str) -> str:
+        name = hashlib.sha256(f"{CACHE_VERSION}:{key}".encode()).hexdigest()
+        return os.path.join(self._directory, name + ".pickle")
+
+    def get(self, key: str):
+        """
+        Returns value of the key and marks it as recently used.
+
+        :param key: key of the entry.
+        :return: value or None if there is no such entry.
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, "rb") as entry:
+                value = pickle.load(entry)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Broken cache entry {path}: {e}")
+            return None
+        os.utime(path)
+        return value
+
+    def put(self, key: str, value) -> bool:
+        """
+        Saves value of the key, then evicts least recently used entries if the cache is too big.
+        The entry bigger than the max size of the cache isn't saved.
+
+        :param key: key of the entry.
+        :param value: picklable value.
+        :return: True if the entry was saved.
+        """
+        path = self._entry_path(key)
+        # entry is written to the temporary file and replaced at once, so readers never see a part of it
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as entry:
+                pickle.dump(value, entry, protocol=pickle.HIGHEST_PROTOCOL)
+                size = entry.tell()
+            if size > self._max_size:
+                logger.info(f"Cache entry of {size} bytes is bigger than the cache, it isn't saved")
+                os.unlink(tmp_path)
+                return False
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._evict(path)
+        return True
+
+    def _evict(self, kept_path: str) -> None:
+        """
+        Removes least recently used entries until total size of the cache is not greater than max size.
+
+        :param kept_path: path to the entry which was just written, it isn't removed.
+        """
+        entries = []
+        with os.scandir(self._directory) as files:
+            for file in files:
+                if file.name.endswith(".pickle"):
+                    stat = file.stat()
+                    entries.append((stat.st_mtime, stat.st_size, file.path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self._max_size:
+                break
+            if path == kept_path:
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
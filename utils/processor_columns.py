@@ -0,0 +1,210 @@
+"""
+Compact columnar representation of the correct stops.
+Integer fields are kept in arrays, stop names are interned in a table, stop_type is a small-int code
+and a_time is kept as minutes since midnight.
+"""
+from array import array
+from functools import lru_cache
+
+STOP_TYPE_CODES = {"": 0, "S": 1, "O": 2, "F": 3}
+STOP_TYPES = tuple(STOP_TYPE_CODES)
+# a_time in 'hh:mm' format for every minute of a day, minutes are converted back without new strings
+A_TIMES = tuple(f"{hours:02}:{minutes:02}" for hours in range(24) for minutes in range(60))
+
+
+@lru_cache(maxsize=None)
+def has_numpy() -> bool:
+    """
+    Checks numpy is installed without importing it, numpy is imported by the vectorized check only,
+    it takes longer to import than the rest of the package. importlib.util is imported on the first call too.
+    """
+    from importlib.util import find_spec
+    return find_spec("numpy") is not None
+
+
+def a_time_to_minutes(a_time: str) -> int:
+    """
+    Converts a_time in 'hh:mm' format to minutes since midnight.
+
+    :param a_time: time in 'hh:mm' format.
+    :return: number of minutes.
+    """
+    return int(a_time[:2]) * 60 + int(a_time[3:])
+
+
+class StopColumns:
+    """Columns of the stops, a row of the columns is a stop."""
+
+    def __init__(self):
+        self.bus_id = array("q")
+        self.stop_id = array("q")
+        self.next_stop = array("q")
+        self.stop_name = array("l")
+        self.stop_type = array("b")
+        self.a_time = array("H")
+        self.names = []
+        self._name_codes = {}
+
+    def __len__(self):
+        return len(self.bus_id)
+
+    def _name_code(self, name: str) -> int:
+        """Returns code of the interned name, the new name is added to the table."""
+        name_code = self._name_codes.get(name)
+        if name_code is None:
+            name_code = self._name_codes[name] = len(self.names)
+            self.names.append(name)
+        return name_code
+
+    def append(self, stop: dict) -> int:
+        """
+        Adds the correct stop to the columns.
+
+        :param stop: dict with correct types and formats of fields.
+        :return: row of the stop.
+        """
+        name_code = self._name_code(stop["stop_name"])
+        self.bus_id.append(stop["bus_id"])
+        self.stop_id.append(stop["stop_id"])
+        self.next_stop.append(stop["next_stop"])
+        self.stop_name.append(name_code)
+        self.stop_type.append(STOP_TYPE_CODES[stop["stop_type"]])
+        self.a_time.append(a_time_to_minutes(stop["a_time"]))
+        return len(self.bus_id) - 1
+
+    def set(self, row: int, stop: dict) -> None:
+        """
+        Replaces the stop of the row, so the row of the removed stop is reused.
+
+        :param row: row of the columns.
+        :param stop: dict with correct types and formats of fields.
+        """
+        self.bus_id[row] = stop["bus_id"]
+        self.stop_id[row] = stop["stop_id"]
+        self.next_stop[row] = stop["next_stop"]
+        self.stop_name[row] = self._name_code(stop["stop_name"])
+        self.stop_type[row] = STOP_TYPE_CODES[stop["stop_type"]]
+        self.a_time[row] = a_time_to_minutes(stop["a_time"])
+
+    def extend(self, other: "StopColumns") -> int:
+        """
+        Adds rows of the other columns, names are interned in the table of these columns.
+
+        :param other: columns to add, they aren't changed.
+        :return: row of the first added stop, rows of the other columns are shifted by it.
+        """
+        offset = len(self.bus_id)
+        name_codes = []
+        for name in other.names:
+            name_codes.append(self._name_code(name))
+        self.bus_id.extend(other.bus_id)
+        self.stop_id.extend(other.stop_id)
+        self.next_stop.extend(other.next_stop)
+        self.stop_name.extend(name_codes[name_code] for name_code in other.stop_name)
+        self.stop_type.extend(other.stop_type)
+        self.a_time.extend(other.a_time)
+        return offset
+
+    def name(self, row: int) -> str:
+        """Returns stop_name of the row."""
+        return self.names[self.stop_name[row]]
+
+    def stop_info(self, row: int) -> tuple:
+        """Returns (stop_name, a_time) of the row."""
+        return self.names[self.stop_name[row]], A_TIMES[self.a_time[row]]
+
+    def record(self, row: int) -> dict:
+        """Returns the row as a dict with test_data."""
+        return dict(bus_id=self.bus_id[row], stop_id=self.stop_id[row], stop_name=self.name(row),
+                    next_stop=self.next_stop[row], stop_type=STOP_TYPES[self.stop_type[row]],
+                    a_time=A_TIMES[self.a_time[row]])
+
+
+class RouteStops:
+    """
+    Stops of the route as a sequence of (stop_name, a_time) pairs, stops are read from the columns by rows.
+    Equal to the list of the same pairs.
+    """
+    __slots__ = ("columns", "rows")
+
+    def __init__(self, columns: StopColumns, rows=()):
+        self.columns = columns
+        self.rows = array("L", rows)
+
+    def append(self, row: int) -> None:
+        self.rows.append(row)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.columns.stop_info(row) for row in self.rows[index]]
+        return self.columns.stop_info(self.rows[index])
+
+    def __iter__(self):
+        return map(self.columns.stop_info, self.rows)
+
+    def __eq__(self, other):
+        if isinstance(other, RouteStops):
+            other = list(other)
+        if not isinstance(other, list):
+            return NotImplemented
+        return list(self) == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def minutes(self) -> array:
+        """Returns a_time of the stops in minutes."""
+        a_time = self.columns.a_time
+        return array("H", [a_time[row] for row in self.rows])
+
+
+class RestoredRouteStops:
+    """
+    Stops of the route whose results were restored without the columns, see DatabaseProcessor.restore_stage_results().
+    Only the number of the stops is known.
+    """
+    __slots__ = ("size",)
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return f"RestoredRouteStops({self.size})"
+
+
+def find_arrival_time_errors_vectorized(columns: StopColumns, routes: list) -> list:
+    """
+    Vectorized version of the arrival time check, it requires numpy.
+    a_time of all routes is gathered in one array, then the first not increasing stop of every route
+    is found by comparing the array with itself shifted by one stop.
+
+    :param columns: columns of the stops.
+    :param routes: list of RouteStops.
+    :return: list with index of the first stop with wrong time or None for every route.
+    """
+    if not has_numpy():
+        raise ImportError("numpy is required for the vectorized arrival time check")
+    import numpy
+    errors = [None] * len(routes)
+    if not routes:
+        return errors
+    lengths = numpy.fromiter((len(route) for route in routes), dtype=numpy.int64, count=len(routes))
+    rows = numpy.concatenate([numpy.frombuffer(route.rows, dtype=f"u{route.rows.itemsize}") for route in routes])
+    minutes = numpy.frombuffer(columns.a_time, dtype=numpy.uint16).astype(numpy.int32)[rows]
+    starts = numpy.cumsum(lengths) - lengths
+    previous = numpy.empty_like(minutes)
+    previous[1:] = minutes[:-1]
+    # the first stop of a route is compared with midnight
+    previous[starts[lengths > 0]] = 0
+    wrong = numpy.flatnonzero(minutes <= previous)
+    route_of_wrong = numpy.searchsorted(starts, wrong, side="right") - 1
+    wrong_routes, first = numpy.unique(route_of_wrong, return_index=True)
+    for route, position in zip(wrong_routes.tolist(), (wrong[first] - starts[wrong_routes]).tolist()):
+        errors[route] = position
+    return errors
@@ -0,0 +1,113 @@
+"""
+Per-record error locations with bounded memory.
+At most limit errors are kept, they are a uniform sample of all errors (reservoir sampling).
+All errors can be spilled to the NDJSON file.
+"""
+import json
+import os
+import random
+import tempfile
+
+
+class ErrorDetails:
+    """Collects (record index, field, value, error) of the errors found by DatabaseProcessor."""
+
+    def __init__(self, limit: int = 1000, spill_file: str = None, seed=None):
+        """
+        :param limit: max number of errors kept in the memory.
+        :param spill_file: path to the NDJSON file for all errors, it is rewritten.
+        :param seed: seed of the sampling, the sample is reproducible with the same seed.
+        """
+        self.limit = limit
+        self.samples = []
+        self.seen = 0
+        self._random = random.Random(seed)
+        self._spill_path = spill_file
+        self._spill_file = open(spill_file, "w") if spill_file else None
+
+    def add(self, index: int, field: str, value, error: str) -> None:
+        """
+        Adds the error of the record.
+
+        :param index: index of the record in the test_data.
+        :param field: name of the field.
+        :param value: wrong value of the field.
+        :param error: "type", "required" or "format".
+        """
+        detail = (index, field, value, error)
+        self.seen += 1
+        if len(self.samples) < self.limit:
+            self.samples.append(detail)
+        else:
+            position = self._random.randrange(self.seen)
+            if position < self.limit:
+                self.samples[position] = detail
+        if self._spill_file is not None:
+            self._spill_file.write(json.dumps(dict(index=index, field=field, value=value, error=error),
+                                              default=repr) + "\n")
+
+    def discard(self, indices, errors: int = 0) -> None:
+        """
+        Removes errors of the records, they are changed and checked again. Their lines are removed
+        from the spill file too, so it has errors of the current test_data only.
+        The sample stays a uniform sample of the remaining errors, the places of the discarded errors
+        are taken by the next added errors first.
+
+        :param indices: indices of the changed records.
+        :param errors: number of errors the records had, they aren't counted in seen anymore.
+        """
+        indices = set(indices)
+        self.samples = [detail for detail in self.samples if detail[0] not in indices]
+        self.seen -= errors
+        if self._spill_file is not None and errors:
+            self._rewrite_spill_file(lambda error: None if error["index"] in indices else error)
+
+    def reindex(self, old_to_new) -> None:
+        """
+        Moves errors to the new indices of their records, when records are inserted or removed before them.
+
+        :param old_to_new: new index of every record, errors of the records with -1 must be discarded before.
+        """
+        self.samples = [(old_to_new[index], *detail) for index, *detail in self.samples]
+        if self._spill_file is not None:
+            self._rewrite_spill_file(lambda error: dict(error, index=old_to_new[error["index"]]))
+
+    def _rewrite_spill_file(self, change) -> None:
+        """
+        Copies errors of the spill file to the new file, which replaces it.
+
+        :param change: function which returns the changed error dict or None if the error is dropped.
+        """
+        self._spill_file.close()
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self._spill_path)), suffix=".tmp")
+        try:
+            with open(self._spill_path) as spill_file, os.fdopen(fd, "w") as new_file:
+                for line in spill_file:
+                    error = change(json.loads(line))
+                    if error is not None:
+                        new_file.write(json.dumps(error) + "\n")
+            os.replace(tmp_path, self._spill_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        finally:
+            self._spill_file = open(self._spill_path, "a")
+
+    def clear(self) -> None:
+        """Removes all errors, the spill file is truncated."""
+        self.samples = []
+        self.seen = 0
+        if self._spill_file is not None:
+            self._spill_file.seek(0)
+            self._spill_file.truncate()
+
+    def flush(self) -> None:
+        """Writes buffered errors to the spill file."""
+        if self._spill_file is not None:
+            self._spill_file.flush()
+
+    def close(self) -> None:
+        """Closes the spill file."""
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
@@ -12,3 +12,11 @@ class FormatFieldsProcessorError(ProcessorError):
 
 class ArrivalTimeProcessorError(ProcessorError):
     pass
+
+
+class RouteProcessorError(ProcessorError):
+    pass
+
+
+class SnapshotProcessorError(ProcessorError):
+    pass
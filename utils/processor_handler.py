@@ -1,18 +1,68 @@
+import glob
+import importlib
 import json
 import logging
+import os
 
 logger = logging.getLogger("app.utils.processor_handler")
 
-def input_database_str() -> list:
+CHUNK_SIZE = 1 << 16
+# decoders of json documents, "auto" picks the fastest installed one
+JSON_DECODERS = ("auto", "orjson", "ujson", "json")
+
+
+def expand_database_paths(path: str) -> list:
+    """
+    Returns .json files of the path: all of them if it is a directory, matching files if it is a glob pattern,
+    otherwise the path itself. Files are sorted, so shards are always merged in the same order.
+
+    :param path: path to the file or the directory, or the glob pattern.
+    :return: list of paths to the files.
+    """
+    if os.path.isdir(path):
+        file_names = sorted(glob.glob(os.path.join(path, "*.json")))
+    elif glob.has_magic(path):
+        file_names = sorted(glob.glob(path))
+    else:
+        return [path]
+    if not file_names:
+        raise FileNotFoundError(f"There are no .json files in {path}")
+    return file_names
+
+
+def get_json_decoder(name: str = "auto"):
+    """
+    Returns function which decodes json document from str or bytes.
+
+    :param name: one of JSON_DECODERS.
+    :return: loads function of the chosen module.
+    """
+    if name not in JSON_DECODERS:
+        raise ValueError(f"Unknown json decoder: {name}")
+    if name == "json":
+        return json.loads
+    # decoders are imported on the first use, so they don't slow down the import of the package
+    for module_name in JSON_DECODERS[1:-1] if name == "auto" else (name,):
+        try:
+            return importlib.import_module(module_name).loads
+        except ImportError:
+            if name != "auto":
+                raise ImportError(f"{name} is required for the {name} json decoder") from None
+    return json.loads
+
+
+def input_database_str(decoder: str = "auto") -> list:
     """
     Read json-string from console, and return dict with test_data
 
+    :param decoder: name of the json decoder, see JSON_DECODERS.
     :return: dict with test_data
     """
+    loads = get_json_decoder(decoder)
     while True:
         database = input("Input json string:")
         try:
-            database_dict = json.loads(database)
+            database_dict = loads(database)
         except Exception as e:
             print(e)
             print("Invalid input")
@@ -21,13 +71,130 @@ def input_database_str() -> list:
         return database_dict
 
 
-def input_database_file(file_name: str) -> list:
+def input_database_file(file_name: str, decoder: str = "auto", use_mmap: bool = False) -> list:
     """
-    Read *.json file and return dict with test_data
+    Read *.json file and return dict with test_data.
+    The file is decoded from bytes, it isn't converted to a python string first.
 
     :param file_name: Full path to the file you want to read.
+    :param decoder: name of the json decoder, see JSON_DECODERS.
+    :param use_mmap: map the file in the memory instead of reading it, orjson decodes it without copying.
     :return: dict with test_data
     """
-    with open(file_name, "r") as json_file:
-        database_dict = json.load(json_file)
-    return database_dict
+    loads = get_json_decoder(decoder)
+    with open(file_name, "rb") as json_file:
+        # empty file can't be mapped
+        if not use_mmap or not os.fstat(json_file.fileno()).st_size:
+            return loads(json_file.read())
+        import mmap
+        with mmap.mmap(json_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            if loads.__module__ == "orjson":
+                with memoryview(mapped_file) as view:
+                    return loads(view)
+            return loads(mapped_file[:])
+
+
+def _file_decode_error(msg: str, buffer: str, position: int, offset: int, lines: int,
+                       line_start: int) -> json.JSONDecodeError:
+    """
+    Creates JSONDecodeError with the position in the file instead of the position in the buffer.
+
+    :param offset: position of the buffer in the file.
+    :param lines: number of lines before the buffer.
+    :param line_start: position of the line which contains the start of the buffer.
+    """
+    error = json.JSONDecodeError(msg, buffer, position)
+    error.pos = offset + position
+    newline = buffer.rfind("\n", 0, position)
+    error.lineno = lines + buffer.count("\n", 0, position) + 1
+    error.colno = position - newline if newline >= 0 else error.pos - line_start + 1
+    error.args = (f"{msg}: line {error.lineno} column {error.colno} (char {error.pos})",)
+    return error
+
+
+def iter_database_file(file_name: str, chunk_size: int = CHUNK_SIZE):
+    """
+    Read *.json file with top-level array chunk by chunk and yield stops one at a time,
+    so the whole file is never loaded in the memory.
+    The next chunk is read only for the stop which is cut by the end of the buffer, so a broken stop fails
+    without reading the rest of the file. Delimiters are checked as by json.loads(), so a missing or extra comma
+    and data after the array are errors. Errors have positions in the file.
+
+    :param file_name: Full path to the file you want to read.
+    :param chunk_size: Number of characters read from the file at once.
+    :return: iterator of dicts with test_data
+    """
+    decoder = json.JSONDecoder()
+    with open(file_name, "r", encoding="utf-8") as json_file:
+        buffer = ""
+        position = 0
+        # position of the buffer in the file, number of lines before it and start of its first line
+        offset = 0
+        lines = 0
+        line_start = 0
+        eof = False
+        # what is expected at the position: "[", "value or ]" after "[", "value" after ",", ", or ]" after the stop
+        # and "end" of the file after "]"
+        expected = "["
+
+        def next_chunk():
+            nonlocal buffer, position, offset, lines, line_start, eof
+            dropped = buffer[:position]
+            lines += dropped.count("\n")
+            newline = dropped.rfind("\n")
+            if newline >= 0:
+                line_start = offset + newline + 1
+            offset += position
+            chunk = json_file.read(chunk_size)
+            buffer = buffer[position:] + chunk
+            position = 0
+            eof = not chunk
+
+        def error(msg: str) -> json.JSONDecodeError:
+            return _file_decode_error(msg, buffer, position, offset, lines, line_start)
+
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position == len(buffer):
+                if not eof:
+                    next_chunk()
+                    continue
+                if expected == "end":
+                    return
+                raise error("Unexpected end of the file")
+            char = buffer[position]
+            if expected == "[":
+                if char != "[":
+                    raise error("Expecting top-level array")
+                expected = "value or ]"
+                position += 1
+                continue
+            if expected == "end":
+                raise error("Extra data")
+            if expected == ", or ]":
+                if char not in ",]":
+                    raise error("Expecting ',' delimiter")
+                expected = "value" if char == "," else "end"
+                position += 1
+                continue
+            if expected == "value or ]" and char == "]":
+                expected = "end"
+                position += 1
+                continue
+            try:
+                stop, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                # the stop is cut by the end of the buffer, the longest cut token is an \uXXXX escape
+                cut = e.pos >= len(buffer) - 6 or e.msg.startswith("Unterminated string")
+                if eof or not cut:
+                    raise _file_decode_error(e.msg, buffer, e.pos, offset, lines, line_start) from None
+                next_chunk()
+                continue
+            # a number is decoded up to the cut ".", "e" or "e+" of its continuation in the next chunk
+            if not eof and type(stop) in (int, float) and end >= len(buffer) - 2:
+                next_chunk()
+                continue
+            position = end
+            expected = ", or ]"
+            yield stop
@@ -0,0 +1,124 @@
+"""
+Instrumentation of DatabaseProcessor stages and reading of the test_data.
+StageProfiler is passed to DatabaseProcessor explicitly, without it stages aren't wrapped by anything
+except one check of the attribute, so there is no cost when profiling is disabled.
+"""
+import cProfile
+import logging
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger("app.utils.processor_profiling")
+
+
+class StageProfiler:
+    """Collects wall time, CPU time, number of records and allocation peak of the stages."""
+
+    def __init__(self, trace_memory: bool = False):
+        """
+        :param trace_memory: measure allocation peaks of the stages with tracemalloc, it slows down the code.
+        """
+        self.trace_memory = trace_memory
+        # memory is measured by the outer stage only, when stages are nested
+        self._tracing_stage = False
+        # name of the stage -> dict of its stats, in order of the first call
+        self.stages = {}
+
+    def _stats(self, name: str) -> dict:
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = dict(calls=0, wall=0.0, cpu=0.0, records=None, peak_memory=None)
+        return stats
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Measures the code in the with block as the stage, stats of several calls are summed.
+        Yields dict of the stats, the number of processed records can be set to its "records" key.
+        """
+        stats = self._stats(name)
+        tracing = self.trace_memory and not self._tracing_stage and tracemalloc.is_tracing()
+        if tracing:
+            self._tracing_stage = True
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield stats
+        finally:
+            stats["wall"] += time.perf_counter() - start_wall
+            stats["cpu"] += time.process_time() - start_cpu
+            stats["calls"] += 1
+            if tracing:
+                self._tracing_stage = False
+                peak = tracemalloc.get_traced_memory()[1] - start_memory
+                stats["peak_memory"] = max(stats["peak_memory"] or 0, peak)
+
+    def iterate(self, name: str, records):
+        """
+        Yields records of the iterator and measures the time spent in it as the stage,
+        e.g. reading of the streamed file, which is interleaved with the scan.
+        """
+        stats = self._stats(name)
+        stats["calls"] += 1
+        stats["records"] = 0
+        iterator = iter(records)
+        while True:
+            start_wall = time.perf_counter()
+            start_cpu = time.process_time()
+            try:
+                record = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                stats["wall"] += time.perf_counter() - start_wall
+                stats["cpu"] += time.process_time() - start_cpu
+            stats["records"] += 1
+            yield record
+
+    def report(self) -> list:
+        """Returns stats of the stages with records per second."""
+        report = []
+        for name, stats in self.stages.items():
+            records_per_second = stats["records"] / stats["wall"] if stats["records"] and stats["wall"] else None
+            report.append(dict(stage=name, records_per_second=records_per_second, **stats))
+        return report
+
+    def log(self) -> None:
+        """Logs stats of the stages."""
+        for stats in self.report():
+            message = f"Stage {stats['stage']}: {stats['calls']} calls, wall {stats['wall'] * 1000:.3f} ms, " \
+                      f"cpu {stats['cpu'] * 1000:.3f} ms"
+            if stats["records_per_second"] is not None:
+                message += f", {stats['records']} records, {stats['records_per_second']:.0f} records/s"
+            if stats["peak_memory"] is not None:
+                message += f", allocation peak {stats['peak_memory'] / 1024:.1f} KiB"
+            logger.info(message)
+
+
+@contextmanager
+def profile(file_name: str, top: int = 25):
+    """
+    Profiles the code in the with block by cProfile and tracemalloc.
+    cProfile stats are dumped to the file_name (see pstats), the top functions by cumulative time
+    and the top lines by memory still allocated at the end are written to the file_name + ".txt".
+    """
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        profiler.dump_stats(file_name)
+        with open(file_name + ".txt", "w") as report:
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(top)
+            report.write("Top lines by allocated memory:\n")
+            for statistic in snapshot.statistics("lineno")[:top]:
+                report.write(f"{statistic}\n")
+        logger.info(f"Profile was written to {file_name} and {file_name}.txt")
@@ -0,0 +1,156 @@
+"""
+Results of DatabaseProcessor checks and their machine-readable output.
+json output is written chunk by chunk and ndjson output record by record, so big reports aren't built
+in the memory as one string.
+"""
+import json
+from dataclasses import dataclass, fields
+from typing import ClassVar
+
+
+@dataclass(slots=True)
+class CheckResult:
+    """Base class of the results, name is the name of the check."""
+    name: ClassVar[str] = ""
+
+    def to_dict(self) -> dict:
+        """Returns fields of the result, values aren't copied."""
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+    def iter_records(self):
+        """Yields dicts for ndjson output, the first one is the summary of the check."""
+        yield dict(check=self.name, **self.to_dict())
+
+
+@dataclass(slots=True)
+class CheckError(CheckResult):
+    """The check wasn't run because of errors found by the previous checks."""
+    check: str
+    error: str
+
+    def iter_records(self):
+        yield dict(check=self.check, error=self.error)
+
+
+@dataclass(slots=True)
+class DataTypeResult(CheckResult):
+    name: ClassVar[str] = "data_type"
+    errors: int
+    fields: dict
+    # number of the scanned records if the scan was stopped because of max_errors, errors are counted only for them
+    stopped_at: object = None
+
+
+@dataclass(slots=True)
+class FormatFieldsResult(CheckResult):
+    name: ClassVar[str] = "format_fields"
+    errors: int
+    fields: dict
+    # number of the scanned records if the scan was stopped because of max_errors, errors are counted only for them
+    stopped_at: object = None
+
+
+@dataclass(slots=True)
+class BusInfoResult(CheckResult):
+    name: ClassVar[str] = "bus_info"
+    # (bus_id, number of stops) pairs
+    lines: list
+
+    def iter_records(self):
+        yield dict(check=self.name, lines=len(self.lines))
+        for bus_id, stops in self.lines:
+            yield dict(check=self.name, bus_id=bus_id, stops=stops)
+
+
+@dataclass(slots=True)
+class StopsInfoResult(CheckResult):
+    name: ClassVar[str] = "stops_info"
+    # bus_id of the first line without start or finish stop, other fields are empty then
+    line_without_start_or_finish: object
+    start: list
+    transfer: list
+    finish: list
+
+
+@dataclass(slots=True)
+class TimeErrorsResult(CheckResult):
+    name: ClassVar[str] = "time_errors"
+    # (bus_id, stop_name) pairs
+    errors: list
+
+    def iter_records(self):
+        yield dict(check=self.name, errors=len(self.errors))
+        for bus_id, stop_name in self.errors:
+            yield dict(check=self.name, bus_id=bus_id, stop_name=stop_name)
+
+
+@dataclass(slots=True)
+class DemandErrorsResult(CheckResult):
+    name: ClassVar[str] = "demand_errors"
+    # sorted stop names
+    errors: list
+
+    def iter_records(self):
+        yield dict(check=self.name, errors=len(self.errors))
+        for stop_name in self.errors:
+            yield dict(check=self.name, stop_name=stop_name)
+
+
+@dataclass(slots=True)
+class ErrorDetailsResult(CheckResult):
+    name: ClassVar[str] = "error_details"
+    # exact numbers of errors, details are only a sample of them if there are more errors than the limit
+    type_errors: int
+    format_errors: int
+    # (record index, field, value, error) tuples sorted by the index
+    details: list
+
+    def iter_records(self):
+        yield dict(check=self.name, type_errors=self.type_errors, format_errors=self.format_errors,
+                   details=len(self.details))
+        for index, field, value, error in self.details:
+            yield dict(check=self.name, index=index, field=field, value=value, error=error)
+
+
+@dataclass(slots=True)
+class DatabaseResult(CheckResult):
+    name: ClassVar[str] = "print_info"
+    # records of the test_data, they aren't copied
+    records: object
+
+    def iter_records(self):
+        for record in self.records:
+            if record is not None:
+                yield dict(check=self.name, **record)
+
+
+def results_to_dict(results: dict) -> dict:
+    """Converts dict of results to dict of dicts, which can be serialized to json."""
+    return {name: result.to_dict() for name, result in results.items()}
+
+
+def write_json(results: dict, file) -> None:
+    """
+    Writes results as one json object, name of the check -> its fields.
+
+    :param results: dict of CheckResult.
+    :param file: text file opened for writing.
+    """
+    encoder = json.JSONEncoder(default=list)
+    for chunk in encoder.iterencode(results_to_dict(results)):
+        file.write(chunk)
+    file.write("\n")
+
+
+def write_ndjson(results: dict, file) -> None:
+    """
+    Writes results as json lines, see CheckResult.iter_records().
+
+    :param results: dict of CheckResult.
+    :param file: text file opened for writing.
+    """
+    encoder = json.JSONEncoder()
+    for result in results.values():
+        for record in result.iter_records():
+            file.write(encoder.encode(record))
+            file.write("\n")
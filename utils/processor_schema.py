@@ -0,0 +1,73 @@
+"""
+Declarative schema of the stop record. Patterns are compiled once at import and shared by every DatabaseProcessor.
+New fields and rules are added here, not in the processor.
+"""
+import re
+from collections import namedtuple
+
+# type - expected python type of the value
+# required - value can't be an empty string
+# type_regex - value must match it, otherwise it is a type error
+# format_regex - value must match it, otherwise it is a format error
+# type_range - (min, max) of the value, otherwise it is a type error
+Field = namedtuple("Field", ["type", "required", "type_regex", "format_regex", "type_range"], defaults=(None,))
+
+# integers are kept in the signed 64-bit columns of the stops
+INT64_RANGE = (-(1 << 63), (1 << 63) - 1)
+
+STOP_TYPE_REGEX = re.compile(r"""
+^                                   # start of string
+.                                   # any of chapter
+?                                   # zero or one consecutive letter
+\Z                                  # end of string, unlike $ it does not match before a trailing newline
+""", re.VERBOSE)
+
+STOP_NAME_FORMAT_REGEX = re.compile(r"""
+^                                   # start of string
+(                                   # start of first part of name 
+[A-Z]                               # first capital letter of word
+\w                                  # any letter, digit or underscore. Equivalent to [a-zA-Z0-9_]
++                                   # one or more consecutive `\w` characters.
+\s                                  # any whitespace chapters
+)                                   # end of first part of name
++                                   # one or more consecutive words with capital letter
+(                                   # start of second part of word
+Road|Avenue|Boulevard|Street        # one of this word is end of second part name
+)                                   # end of second part of word                    
+\Z                                  # end of string, unlike $ it does not match before a trailing newline
+""", re.VERBOSE)
+
+STOP_TYPE_FORMAT_REGEX = re.compile(r"""
+^                                   # start of string                       
+[SOF]                               # a single chapter of: S,O or F 
+?                                   # zero or one consecutive letter
+\Z                                  # end of string, unlike $ it does not match before a trailing newline
+""", re.VERBOSE)
+
+A_TIME_FORMAT_REGEX = re.compile(r"""
+^                                   # start of string 
+(                                   # start of hour part
+[01]                                # first digit 1 or 0
+\d                                  # any of digit
+|                                   # or 
+2                                   # digit 2
+[0-3]                               # a single chapter of: 0,1,2 or 3 
+)                                   # end of hour part
+(:)                                 # delimiter  
+(                                   # end of minutes part
+[0-5]                               # a single chapter of: 0-5 
+\d                                  # any of digit
+)                                   # end of minutes part
+\Z                                  # end of string, unlike $ it does not match before a trailing newline
+""", re.VERBOSE)
+
+FIELDS = {
+    "bus_id": Field(int, False, None, None, INT64_RANGE),
+    "stop_id": Field(int, False, None, None, INT64_RANGE),
+    "stop_name": Field(str, True, None, STOP_NAME_FORMAT_REGEX),
+    "next_stop": Field(int, False, None, None, INT64_RANGE),
+    "stop_type": Field(str, False, STOP_TYPE_REGEX, STOP_TYPE_FORMAT_REGEX),
+    "a_time": Field(str, True, None, A_TIME_FORMAT_REGEX),
+}
+
+FORMAT_FIELDS = tuple(name for name, field in FIELDS.items() if field.format_regex)
@@ -0,0 +1,194 @@
+"""
+Long-lived asyncio validation service. Payloads are json arrays with test_data, they are read line by line
+from stdin or from bodies of HTTP POST requests, the answer is json with results of DatabaseProcessor.validate().
+Small payloads which come at the same time are validated in one batch in the executor.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import sys
+from collections import OrderedDict
+
+from utils.processors import DatabaseProcessor
+from utils.processor_handler import get_json_decoder
+from utils.processor_results import results_to_dict
+
+logger = logging.getLogger("app.utils.processor_service")
+
+BATCH_SIZE = 64
+BATCH_DELAY = 0.005
+RESULTS_CACHE_SIZE = 1024
+MAX_BODY_SIZE = 256 << 20
+MAX_IN_FLIGHT = 256
+
+
+def validate_payload(payload: str) -> dict:
+    """
+    Validates json-string with test_data.
+
+    :param payload: json array with test_data.
+    :return: results of DatabaseProcessor.validate() as dicts or dict with 'error' if the payload is invalid.
+    """
+    try:
+        database = get_json_decoder()(payload)
+        if not isinstance(database, list):
+            raise ValueError("Expecting json array of stops")
+        return results_to_dict(DatabaseProcessor(database).validate())
+    except Exception as e:
+        return dict(error=f"{type(e).__name__}: {e}")
+
+
+def validate_batch(payloads: list) -> list:
+    """Validates several payloads in one call, see validate_payload()."""
+    return [validate_payload(payload) for payload in payloads]
+
+
+class ValidationService:
+    """Validates payloads in batches and keeps results of the recent payloads in the memory."""
+
+    def __init__(self, batch_size: int = BATCH_SIZE, batch_delay: float = BATCH_DELAY,
+                 cache_size: int = RESULTS_CACHE_SIZE):
+        """
+        :param batch_size: max number of payloads validated in one batch.
+        :param batch_delay: time in seconds the batch waits for more payloads.
+        :param cache_size: number of results of the recent payloads kept in the memory.
+        """
+        self._batch_size = batch_size
+        self._batch_delay = batch_delay
+        self._cache_size = cache_size
+        self._results = OrderedDict()
+        self._queue = None
+        self._worker = None
+
+    async def validate(self, payload: str) -> dict:
+        """
+        Returns results of the payload validation, the payload waits for its batch.
+
+        :param payload: json array with test_data.
+        :return: results of DatabaseProcessor.validate().
+        """
+        key = hashlib.sha256(payload.encode()).digest()
+        if key in self._results:
+            self._results.move_to_end(key)
+            return self._results[key]
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._process_batches())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((payload, future))
+        result = await future
+        self._results[key] = result
+        if len(self._results) > self._cache_size:
+            self._results.popitem(last=False)
+        return result
+
+    async def _process_batches(self) -> None:
+        """Collects payloads in batches and validates them in the executor."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._batch_delay
+            while len(batch) < self._batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            payloads = [payload for payload, _ in batch]
+            try:
+                results = await loop.run_in_executor(None, validate_batch, payloads)
+            except Exception as e:
+                results = [dict(error=f"{type(e).__name__}: {e}")] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def close(self) -> None:
+        """Stops the batch worker."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+
+async def serve_stdin(service: ValidationService, max_in_flight: int = MAX_IN_FLIGHT) -> None:
+    """
+    Reads payloads line by line from stdin and writes json line with 'id' (number of the line from 0)
+    and 'results' for each of them. Answers can be written not in order of the lines.
+
+    :param service: service which validates the payloads.
+    :param max_in_flight: max number of payloads read and not answered yet, the next line is read
+                          when one of them is answered, so a fast producer doesn't fill the memory.
+    """
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=MAX_BODY_SIZE)
+    try:
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        readline = reader.readline
+    except ValueError:
+        # stdin redirected from a regular file can't be read by the event loop, it is read in the thread
+        def readline():
+            return loop.run_in_executor(None, sys.stdin.buffer.readline)
+    tasks = set()
+    in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def answer(line_id: int, payload: str) -> None:
+        try:
+            results = await service.validate(payload)
+            sys.stdout.write(json.dumps(dict(id=line_id, results=results)) + "\n")
+            sys.stdout.flush()
+        finally:
+            in_flight.release()
+
+    line_id = 0
+    while True:
+        await in_flight.acquire()
+        line = await readline()
+        if not line:
+            break
+        if line.strip():
+            task = asyncio.create_task(answer(line_id, line.decode()))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        else:
+            in_flight.release()
+        line_id += 1
+    if tasks:
+        await asyncio.gather(*tasks)
+    await service.close()
+
+
+async def serve_http(service: ValidationService, host: str, port: int) -> None:
+    """Answers HTTP POST requests with payload in the body, the connection is closed after the answer."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+            if not request_line.startswith(b"POST ") or not 0 < length <= MAX_BODY_SIZE:
+                status, body = "400 Bad Request", dict(error="Expecting POST request with json body")
+            else:
+                status, body = "200 OK", await service.validate((await reader.readexactly(length)).decode())
+            content = json.dumps(body).encode()
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(content)}\r\nConnection: close\r\n\r\n".encode() + content)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            logger.warning(e)
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Validation service is listening on {host}:{port}.")
+    async with server:
+        await server.serve_forever()
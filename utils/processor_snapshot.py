@@ -0,0 +1,141 @@
+"""
+Binary snapshot of the validated test_data and results of the checks, see DatabaseProcessor.export_snapshot().
+The file is the prefix, the json header and sections of arrays aligned to 8 bytes:
+    magic (8 bytes), version (uint32), length of the header (uint32), header, sections.
+The header has results of the checks and offset, size and typecode of every section. Sections are read
+by casts of the memory-mapped file, so the columns of the stops aren't parsed or copied.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from collections.abc import Sequence
+
+from utils.processor_errors import SnapshotProcessorError
+
+SNAPSHOT_MAGIC = b"EZRSNAP\0"
+# must be changed when sections or the header get other structure
+SNAPSHOT_VERSION = 1
+PREFIX = struct.Struct("<8sII")
+ALIGNMENT = 8
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_snapshot(file_name: str, header: dict, sections: dict) -> None:
+    """
+    Writes the snapshot, the file is replaced at once, so readers never see a part of it.
+
+    :param file_name: path to the snapshot file.
+    :param header: dict which can be serialized to json.
+    :param sections: dict, name of the section -> array or other object with the buffer protocol.
+    """
+    views = {name: memoryview(section) for name, section in sections.items()}
+    layout = {}
+    offset = 0
+    for name, view in views.items():
+        layout[name] = [offset, view.nbytes, view.format, view.itemsize]
+        offset = _aligned(offset + view.nbytes)
+    header = dict(header, byteorder=sys.byteorder, sections=layout)
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    data_start = _aligned(PREFIX.size + len(header_bytes))
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_name)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(PREFIX.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header_bytes)))
+            file.write(header_bytes)
+            for name, view in views.items():
+                file.write(bytes(data_start + layout[name][0] - file.tell()))
+                file.write(view)
+        os.replace(tmp_path, file_name)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_snapshot(file_name: str) -> tuple:
+    """
+    Maps the snapshot in the memory, sections are read-only views of the mapped file, it is unmapped
+    when they aren't used anymore.
+
+    :param file_name: path to the snapshot file.
+    :return: (header, dict, name of the section -> memoryview).
+    """
+    with open(file_name, "rb") as file:
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise SnapshotProcessorError(f"File {file_name} is empty") from None
+    view = memoryview(data)
+    if len(view) < PREFIX.size:
+        raise SnapshotProcessorError(f"File {file_name} isn't a snapshot")
+    magic, version, header_size = PREFIX.unpack_from(view)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotProcessorError(f"File {file_name} isn't a snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotProcessorError(f"Snapshot {file_name} has version {version}, {SNAPSHOT_VERSION} is expected")
+    header = json.loads(bytes(view[PREFIX.size:PREFIX.size + header_size]))
+    if header["byteorder"] != sys.byteorder:
+        raise SnapshotProcessorError(f"Snapshot {file_name} was written on the {header['byteorder']}-endian machine")
+    data_start = _aligned(PREFIX.size + header_size)
+    sections = {}
+    for name, (offset, size, typecode, itemsize) in header.pop("sections").items():
+        if struct.calcsize(typecode) != itemsize:
+            raise SnapshotProcessorError(f"Section {name} of the snapshot {file_name} has {itemsize}-byte "
+                                         f"items '{typecode}', they have other size on this machine")
+        start = data_start + offset
+        if start + size > len(view):
+            raise SnapshotProcessorError(f"Snapshot {file_name} is truncated")
+        sections[name] = view[start:start + size].cast(typecode)
+    return header, sections
+
+
+class SnapshotNames(Sequence):
+    """Table of the interned stop names of the snapshot, every name is decoded when it is read."""
+    __slots__ = ("data", "offsets")
+
+    def __init__(self, data, offsets):
+        """
+        :param data: utf-8 encoded names one after another.
+        :param offsets: offset of every name in the data and the size of the data at the end.
+        """
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("name index out of range")
+        return str(self.data[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+
+
+class SnapshotRecords(Sequence):
+    """Records of the snapshot, every record is created from the columns when it is read."""
+    __slots__ = ("columns", "record_rows")
+
+    def __init__(self, columns, record_rows):
+        """
+        :param columns: StopColumns of the snapshot.
+        :param record_rows: row of every record, -1 for the removed ones.
+        """
+        self.columns = columns
+        self.record_rows = record_rows
+
+    def __len__(self):
+        return len(self.record_rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        row = self.record_rows[index]
+        return None if row < 0 else self.columns.record(row)
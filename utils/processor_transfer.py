@@ -0,0 +1,105 @@
+"""
+Transfer stop detection over the columns of the stops, without the index of lines of every stop.
+"compact" keeps two small integers per interned stop name, "sketch" keeps a sketch of distinct lines of a fixed size
+and exact counters only for the stops which passed it.
+"""
+from array import array
+
+from utils.processor_columns import StopColumns
+
+# the stop is seen on one line, on several lines
+ONE_LINE, TRANSFER = 1, 2
+# primes of the hash functions of the sketch rows, (a * code + b) mod p is a universal hash of the code
+SKETCH_PRIME = (1 << 61) - 1
+SKETCH_HASHES = ((0x9E3779B97F4A7C15, 0x632BE59BD9B4E019), (0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9),
+                 (0xD6E8FEB86659FD93, 0x27D4EB2F165667C5), (0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53))
+# approximate size of the candidate in the dict of candidates and the set of transfer stops in bytes
+CANDIDATE_SIZE = 128
+
+
+def find_transfer_stops_compact(columns: StopColumns) -> list:
+    """
+    Finds stops of several lines, the first line of the stop and its state are kept in arrays indexed by
+    the code of the interned stop name, so the memory is 9 bytes per stop name.
+
+    :param columns: columns of the correct stops.
+    :return: sorted names of the transfer stops.
+    """
+    names = len(columns.names)
+    first_line = array("q", bytes(8 * names))
+    state = bytearray(names)
+    for code, bus_id in zip(columns.stop_name, columns.bus_id):
+        if not state[code]:
+            state[code] = ONE_LINE
+            first_line[code] = bus_id
+        elif state[code] == ONE_LINE and first_line[code] != bus_id:
+            state[code] = TRANSFER
+    return sorted(columns.names[code] for code in range(names) if state[code] == TRANSFER)
+
+
+class LineSketch:
+    """
+    Sketch of distinct lines of small integer keys. Every row of the sketch maps the key to a cell, the cell keeps
+    the first line seen in it and turns to TRANSFER when another line is seen, so repeated stops of one line don't
+    add up as occurrences would.
+    """
+
+    def __init__(self, memory: int):
+        """
+        :param memory: size of the cells in bytes, a cell takes 9 bytes.
+        """
+        self.width = max(1, memory // (9 * len(SKETCH_HASHES)))
+        self.lines = [array("q", bytes(8 * self.width)) for _ in SKETCH_HASHES]
+        self.states = [bytearray(self.width) for _ in SKETCH_HASHES]
+
+    def _indices(self, key: int):
+        width = self.width
+        return [(a * key + b) % SKETCH_PRIME % width for a, b in SKETCH_HASHES]
+
+    def add(self, key: int, line: int) -> None:
+        for lines, states, index in zip(self.lines, self.states, self._indices(key)):
+            if not states[index]:
+                states[index] = ONE_LINE
+                lines[index] = line
+            elif states[index] == ONE_LINE and lines[index] != line:
+                states[index] = TRANSFER
+
+    def estimate(self, key: int) -> int:
+        """Returns TRANSFER if the key may be seen on several lines, it is always TRANSFER if it is."""
+        return min(states[index] for states, index in zip(self.states, self._indices(key)))
+
+
+def find_transfer_stops_sketch(columns: StopColumns, memory: int) -> list:
+    """
+    Finds stops of several lines in two passes. The first pass adds pairs of the stop and its line to the sketch of
+    distinct lines of the fixed size. Cells of the sketch are shared by stops, so every stop of several lines is
+    a candidate and some stops of one line are too. The second pass confirms the candidates with exact counters,
+    false positives of the sketch are dropped. When the sketch is too small for the number of stop names,
+    the candidates would take more than the memory, so the stops are found by find_transfer_stops_compact instead.
+
+    :param columns: columns of the correct stops.
+    :param memory: size of the sketch in bytes, the candidates take up to the same size.
+    :return: sorted names of the transfer stops.
+    """
+    sketch = LineSketch(memory)
+    for code, bus_id in zip(columns.stop_name, columns.bus_id):
+        sketch.add(code, bus_id)
+    # code of the candidate -> the first line of the stop
+    candidates = {}
+    max_candidates = memory // CANDIDATE_SIZE
+    for code in range(len(columns.names)):
+        if sketch.estimate(code) == TRANSFER:
+            if len(candidates) == max_candidates:
+                del sketch, candidates
+                return find_transfer_stops_compact(columns)
+            candidates[code] = None
+    del sketch
+    transfer_codes = set()
+    for code, bus_id in zip(columns.stop_name, columns.bus_id):
+        if code in candidates:
+            line = candidates[code]
+            if line is None:
+                candidates[code] = bus_id
+            elif line != bus_id:
+                transfer_codes.add(code)
+    return sorted(columns.names[code] for code in transfer_codes)
@@ -0,0 +1,49 @@
+"""
+Detection of changes of the test_data file for the watch mode, the file is polled by os.stat(),
+so it works on every file system without notifications.
+"""
+import os
+import time
+
+
+def file_signature(file_name: str):
+    """
+    Returns (inode, mtime in nanoseconds, size) of the file, the inode is changed when the file is replaced
+    by the new one, e.g. by editors.
+
+    :param file_name: path to the file.
+    :return: tuple or None if there is no such file.
+    """
+    try:
+        stat = os.stat(file_name)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def watch_file(file_name: str, interval: float = 0.1, debounce: float = 0.25, sleep=time.sleep,
+               clock=time.monotonic):
+    """
+    Polls the file and yields its signature after every change. A burst of writes is debounced:
+    the change is yielded once, when the file hasn't changed for debounce seconds.
+    The missing file (e.g. while it is replaced) is waited for.
+
+    :param file_name: path to the file.
+    :param interval: seconds between polls.
+    :param debounce: seconds the file must stay unchanged after the last write.
+    :param sleep: function which waits for the seconds.
+    :param clock: function which returns the current time in seconds.
+    :return: generator of signatures, see file_signature().
+    """
+    signature = file_signature(file_name)
+    # time of the last change which isn't yielded yet
+    changed_at = None
+    while True:
+        sleep(interval)
+        current = file_signature(file_name)
+        if current != signature:
+            signature = current
+            changed_at = clock()
+        elif changed_at is not None and current is not None and clock() - changed_at >= debounce:
+            changed_at = None
+            yield current
@@ -1,73 +1,956 @@
-import re
+import sys
+from array import array
 from collections import Counter
-from functools import wraps
+from collections.abc import Iterator
+from functools import partial, wraps
 
+from utils.processor_errors import ProcessorError
 from utils.processor_errors import DataTypeProcessorError
 from utils.processor_errors import FormatFieldsProcessorError
 from utils.processor_errors import ArrivalTimeProcessorError
+from utils.processor_errors import RouteProcessorError
+from utils.processor_errors import SnapshotProcessorError
+from utils.processor_schema import FIELDS, FORMAT_FIELDS, A_TIME_FORMAT_REGEX
+from utils.processor_columns import StopColumns, RouteStops, RestoredRouteStops, STOP_TYPE_CODES, A_TIMES
+from utils.processor_columns import a_time_to_minutes
+from utils.processor_columns import find_arrival_time_errors_vectorized, has_numpy
+# json decoders, results, snapshots and indexes of transfer stops are imported by the methods which use them,
+# so importing the module stays cheap
+
+# number of the stops from which the vectorized arrival time check is faster than the loop,
+# when numpy is already imported and when it must be imported first (it takes about 100 ms)
+NUMPY_MIN_ROWS = 5_000
+NUMPY_IMPORT_MIN_ROWS = 400_000
+
+
+def _find_route_arrival_time_error(minutes) -> int:
+    """
+    Checks the time on the route, see DatabaseProcessor._check_arrival_time_errors().
+
+    :param minutes: a_time of the route stops in minutes.
+    :return: index of the first stop with wrong time or None.
+    """
+    previous_time = 0
+    for index, current_time in enumerate(minutes):
+        if current_time <= previous_time:
+            return index
+        previous_time = current_time
+    return None
+
+
+def _find_route_terminal_stops(terminal_stops: tuple, cut_by_window: bool = False):
+    """
+    Checks the route has exactly one start and one finish stop.
+
+    :param terminal_stops: pair of 'start' and 'finish' lists of the route from DatabaseProcessor._bus_route_info.
+    :param cut_by_window: the route has only stops of the a_time window, start or finish stop may be outside of it.
+    :return: (start stop name, finish stop name) or None if the route hasn't one start or finish stop.
+             Name is None if the stop is outside of the window.
+    """
+    start, finish = terminal_stops
+    if cut_by_window and len(start) <= 1 and len(finish) <= 1:
+        return start[0][0] if start else None, finish[0][0] if finish else None
+    if len(start) != 1 or len(finish) != 1:
+        return None
+    return start[0][0], finish[0][0]
+
+
+def _order_route(columns: StopColumns, rows, cut_by_window: bool = False) -> tuple:
+    """
+    Orders stops of the route by following next_stop links from the stop nobody links to.
+    Stop with next_stop 0 is the last one.
+
+    :param columns: columns of the stops.
+    :param rows: rows of the route stops in any order.
+    :param cut_by_window: the route has only stops of the a_time window, the last of them links to the stop
+                          outside of the window.
+    :return: (rows in the route order, None) or (rows in the input order, description of the broken route).
+    """
+    stop_id = columns.stop_id
+    next_stop = columns.next_stop
+    stop_rows = {}
+    for row in rows:
+        if stop_rows.setdefault(stop_id[row], row) != row:
+            return rows, f"duplicate stop_id {stop_id[row]}"
+    linked = set()
+    for row in rows:
+        if next_stop[row]:
+            if next_stop[row] not in stop_rows:
+                if cut_by_window:
+                    continue
+                return rows, f"stop_id {stop_id[row]} links to missing stop {next_stop[row]}"
+            if next_stop[row] in linked:
+                return rows, f"stop_id {next_stop[row]} is linked by several stops"
+            linked.add(next_stop[row])
+    first_stops = [stop for stop in stop_rows if stop not in linked]
+    if not first_stops:
+        return rows, "route is a cycle"
+    if len(first_stops) > 1:
+        return rows, f"route is split into fragments starting with stop_id {sorted(first_stops)}"
+    ordered_rows = []
+    row = stop_rows[first_stops[0]]
+    while len(ordered_rows) < len(stop_rows):
+        ordered_rows.append(row)
+        if not next_stop[row] or next_stop[row] not in stop_rows:
+            break
+        row = stop_rows[next_stop[row]]
+    if len(ordered_rows) < len(stop_rows):
+        return rows, "route contains a cycle, which isn't linked to the first stop"
+    return ordered_rows, None
+
+
+def _scan_shard(shard: tuple) -> dict:
+    """
+    Scans one file of the sharded test_data, it is run in the worker process.
+
+    :param shard: (file_name, json_decoder, stream, options of the scan), see DatabaseProcessor.from_shards().
+    :return: results of the scan without the test_data, see DatabaseProcessor.get_results().
+    """
+    from utils.processor_handler import input_database_file, iter_database_file
+    file_name, json_decoder, stream, options = shard
+    database = iter_database_file(file_name) if stream else iter(input_database_file(file_name, json_decoder))
+    processor = DatabaseProcessor(database, arrival_time_backend="python", **options)
+    processor._check_data_type()
+    return processor.get_results()
 
 
 class DatabaseProcessor:
-    def __init__(self, database):
+    ARRIVAL_TIME_BACKENDS = ("auto", "python", "numpy")
+    TRANSFER_INDEXES = ("sets", "compact", "sketch")
+    # columns of StopColumns which are written to the snapshot as they are
+    SNAPSHOT_COLUMNS = ("bus_id", "stop_id", "next_stop", "stop_name", "stop_type", "a_time")
+
+    def __init__(self, database, workers: int = 1, arrival_time_backend: str = "auto", error_details=None,
+                 max_errors: int = None, profiler=None, bus_ids=None, a_time_range: tuple = None,
+                 transfer_index: str = "sets", transfer_memory: int = 1 << 20):
+        """
+        :param database: list of dicts with test_data or iterator of them (see iter_database_file()).
+                         Iterator is consumed in a single pass and stops aren't kept in the memory.
+        :param workers: number of processes for route checks, routes are checked in this process if it is 1.
+        :param arrival_time_backend: "python" - loop over the stops of every route,
+                                     "numpy" - vectorized check of all routes at once,
+                                     "auto" - chosen when the check is run, "numpy" if it is installed, there are
+                                              no workers and enough stops to pay off, otherwise "python".
+        :param error_details: ErrorDetails which collects index, field and value of every type and format error.
+        :param max_errors: budget of type and format errors, the scan stops as soon as it is exceeded,
+                           0 stops on the first error. Numbers of errors are counted only for the scanned records then.
+        :param profiler: StageProfiler which measures the stages.
+        :param bus_ids: only these lines are checked, other records are skipped by the scan and only their
+                        stop names are kept for the transfer stops.
+        :param a_time_range: ('hh:mm', 'hh:mm'), only stops arriving in this window (inclusive) are checked,
+                             routes are cut by it and lines may have no start or finish stop in it.
+                             Stops with a wrong a_time are checked, their time is unknown.
+        :param transfer_index: "sets" - set of lines of every stop name is kept, it is required by filters
+                                        and changes of the test_data,
+                               "compact" - transfer stops are found from the columns, 9 bytes per stop name,
+                               "sketch" - sketch of distinct lines of transfer_memory bytes pre-screens the stops,
+                                          then only the candidates are counted exactly, "compact" is used
+                                          when the candidates don't fit in transfer_memory bytes.
+        :param transfer_memory: size of the sketch in bytes.
+        """
+        if arrival_time_backend not in self.ARRIVAL_TIME_BACKENDS:
+            raise ValueError(f"Unknown arrival time backend: {arrival_time_backend}")
+        if arrival_time_backend == "numpy" and not has_numpy():
+            raise ImportError("numpy is required for the numpy arrival time backend")
+        if transfer_index not in self.TRANSFER_INDEXES:
+            raise ValueError(f"Unknown transfer index: {transfer_index}")
+        if transfer_index != "sets" and (bus_ids is not None or a_time_range is not None):
+            raise ValueError("Filters of the test_data require the 'sets' transfer index")
+        if a_time_range is not None and not all(A_TIME_FORMAT_REGEX.match(a_time) for a_time in a_time_range):
+            raise ValueError(f"Wrong a_time range: {a_time_range}, 'hh:mm' format is expected")
         self._database = database
-        self._type_errors = dict(bus_id=0, stop_id=0, stop_name=0, next_stop=0, stop_type=0, a_time=0)
+        self._workers = workers
+        self._arrival_time_backend = arrival_time_backend
+        self._error_details = error_details
+        self._max_errors = max_errors
+        self._profiler = profiler
+        self._bus_ids = frozenset(bus_ids) if bus_ids is not None else None
+        self._a_time_range = tuple(map(a_time_to_minutes, a_time_range)) if a_time_range is not None else None
+        self._transfer_index = transfer_index
+        self._transfer_memory = transfer_memory
+        self._streamed = isinstance(database, Iterator)
+        self._reset_results()
+
+    def _reset_results(self) -> None:
+        """Sets results of all stages to the initial state."""
+        self._type_errors = dict.fromkeys(FIELDS, 0)
         self._total_type_errors = 0
-        self._format_errors = dict(stop_name=0, stop_type=0, a_time=0)
+        self._format_errors = dict.fromkeys(FORMAT_FIELDS, 0)
         self._total_format_errors = 0
-        self._bus_route_info = {}
-        self._arrival_time_errors = []
-        self._demand_stops_errors = set()
+        # names of stages whose results are computed: "scan", "routes", "transfer", "arrival_time", "demand"
+        self._computed_stages = set()
+        # number of the scanned records if the scan was stopped because of max_errors
+        self._stopped_at = None
+        self._scanned_records = 0
+        if self._error_details is not None:
+            self._error_details.clear()
+        self._clear_routes()
+
+    def invalidate(self, database=None) -> None:
+        """
+        Drops results of all stages, they will be computed again on the next call.
+        Must be called when the underlying test_data is changed.
+
+        :param database: new test_data, if omitted the current one is processed again.
+        """
+        if database is not None:
+            self._database = database
+            self._streamed = isinstance(database, Iterator)
+        elif self._streamed:
+            raise ProcessorError("Streamed test_data has already been consumed and can't be processed again")
+        self._reset_results()
 
     def get_database(self):
         """Printing input test_data."""
+        records = self.check_database().records
         print("Input test_data:")
-        for i in self._database:
+        for i in records:
+            if i is None:
+                continue
             print()
             for j in i.items():
                 print(*j, sep=" : ")
 
+    def _map_routes(self, func, routes: list) -> list:
+        """
+        Applies func to every item of routes, in the pool of processes if there are workers.
+        Results are in order of routes, so they don't depend on number of workers.
+
+        :param func: module level function, it must be picklable.
+        :param routes: list of picklable arguments, one for a route.
+        :return: list of results.
+        """
+        if self._workers <= 1 or len(routes) <= 1:
+            return list(map(func, routes))
+        # multiprocessing is imported only when there are workers, it slows down the import of the module
+        from concurrent.futures import ProcessPoolExecutor
+        chunk_size = max(1, len(routes) // (self._workers * 4))
+        with ProcessPoolExecutor(max_workers=self._workers) as executor:
+            return list(executor.map(func, routes, chunksize=chunk_size))
+
+    def _count_stop_errors(self, stop: dict, sign: int = 1, index: int = None) -> bool:
+        """
+        Adds type and format errors of the stop to _type_errors and _format_errors,
+        and to _error_details if they are collected.
+
+        :param stop: dict with test_data.
+        :param sign: 1 to add errors of the stop, -1 to subtract them when the stop is changed.
+        :param index: index of the stop in the test_data.
+        :return: True if the stop is correct.
+        """
+        type_errors = self._type_errors
+        format_errors = self._format_errors
+        correct_stop = True
+        for key, value in stop.items():
+            field = FIELDS[key]
+            if type(value) != field.type:
+                type_errors[key] += sign
+                correct_stop = False
+                if self._error_details is not None and sign > 0:
+                    self._error_details.add(index, key, value, "type")
+                continue
+            if field.type_regex and not field.type_regex.match(value) or \
+                    field.type_range and not field.type_range[0] <= value <= field.type_range[1]:
+                type_errors[key] += sign
+                correct_stop = False
+                if self._error_details is not None and sign > 0:
+                    self._error_details.add(index, key, value, "type")
+            if field.required and value == "":
+                type_errors[key] += sign
+                correct_stop = False
+                if self._error_details is not None and sign > 0:
+                    self._error_details.add(index, key, value, "required")
+            if field.format_regex and not field.format_regex.match(value):
+                format_errors[key] += sign
+                correct_stop = False
+                if self._error_details is not None and sign > 0:
+                    self._error_details.add(index, key, value, "format")
+        return correct_stop
+
+    def _profiled_stage(func):
+        @wraps(func)
+        def wrapper(self, *args):
+            if self._profiler is None:
+                return func(self, *args)
+            with self._profiler.stage(func.__name__) as stats:
+                ret = func(self, *args)
+                stats["records"] = self._scanned_records
+            return ret
+
+        return wrapper
+
+    @_profiled_stage
+    def _scan_database(self) -> None:
+        """
+        Processes the database in a single pass over the records.
+        Checks data types and formats of fields, creates routes of buses with index of the stops lines
+        and collects on-demand stops,
+        so _check_data_type(), _check_format_fields(), _calculate_stops() and _check_demand_errors()
+        don't have to walk the database again.
+        Routes are created only while the test_data is correct, they are useless otherwise.
+        """
+        bus_route_info = self._bus_route_info
+        on_demand_stops = self._on_demand_stops
+        # the index of lines isn't needed if transfer stops are found from the columns
+        stop_lines = self._stop_lines if self._transfer_index == "sets" else None
+        columns = self._columns
+        record_rows = self._record_rows
+        row_records = self._row_records
+        line_first_records = self._line_first_records
+        count_stop_errors = self._count_stop_errors
+        max_errors = self._max_errors
+        filtered = self._bus_ids is not None or self._a_time_range is not None
+        select_stop = self._select_stop
+        correct_data = True
+        index = -1
+        for index, stop in enumerate(self._database):
+            if stop is None:
+                # the record was removed by remove_record()
+                record_rows.append(-1)
+                continue
+            if filtered and not select_stop(stop):
+                continue
+            if not count_stop_errors(stop, 1, index):
+                correct_data = False
+                if max_errors is not None and \
+                        sum(self._type_errors.values()) + sum(self._format_errors.values()) > max_errors:
+                    self._stopped_at = index + 1
+                    break
+            if not correct_data:
+                continue
+            row = columns.append(stop)
+            record_rows.append(row)
+            row_records.append(index)
+            bus_id = stop['bus_id']
+            bus = bus_route_info.get(bus_id)
+            if bus is None:
+                bus = bus_route_info[bus_id] = dict(start=[], stops=RouteStops(columns), finish=[])
+                line_first_records[bus_id] = index
+            if stop_lines is not None:
+                stop_lines.setdefault(stop["stop_name"], set()).add(bus_id)
+            bus["stops"].append(row)
+            if stop["stop_type"] == "S":
+                bus["start"].append(columns.stop_info(row))
+            elif stop["stop_type"] == "F":
+                bus["finish"].append(columns.stop_info(row))
+            elif stop["stop_type"] == "O":
+                on_demand_stops[stop["stop_name"]] += 1
+        if not correct_data:
+            self._clear_routes()
+        self._scanned_records = index + 1
+        self._total_type_errors = sum(self._type_errors.values())
+        self._total_format_errors = sum(self._format_errors.values())
+        self._computed_stages.add("scan")
+
+    def _select_stop(self, stop: dict) -> bool:
+        """
+        Checks the stop passes bus_ids and a_time_range filters.
+        Stop name of the skipped stop is added to the index of lines, so transfer stops are found across all lines.
+
+        :param stop: dict with test_data, its fields may be wrong.
+        :return: True if the stop must be checked.
+        """
+        bus_id = stop.get("bus_id")
+        selected = self._bus_ids is None or bus_id in self._bus_ids
+        if selected and self._a_time_range is not None:
+            a_time = stop.get("a_time")
+            if type(a_time) == str and A_TIME_FORMAT_REGEX.match(a_time):
+                start, finish = self._a_time_range
+                selected = start <= a_time_to_minutes(a_time) <= finish
+        if not selected and type(bus_id) == int and type(stop.get("stop_name")) == str:
+            self._stop_lines.setdefault(stop["stop_name"], set()).add(bus_id)
+        return selected
+
+    def _clear_routes(self) -> None:
+        """Drops everything that is created from correct test_data only."""
+        self._columns = StopColumns()
+        self._record_rows = array("q")
+        self._row_records = array("q")
+        # rows of the removed and changed records, they are reused by the next changes
+        self._free_rows = []
+        self._line_first_records = {}
+        self._bus_route_info = {}
+        self._on_demand_stops = Counter()
+        self._stop_lines = {}
+        self._route_errors = []
+        self._transfer_stops = []
+        self._arrival_time_errors = []
+        self._demand_stops_errors = set()
+        self._computed_stages.intersection_update({"scan"})
+
+    def add_records(self, records: list) -> range:
+        """
+        Appends records to the test_data and updates results only for the lines and stops they affect.
+
+        :param records: list of dicts with test_data.
+        :return: indices of the added records.
+        """
+        self._check_editable()
+        start = len(self._database)
+        self._database.extend(records)
+        indices = range(start, len(self._database))
+        self._update_records(indices, [None] * len(indices))
+        return indices
+
+    def update_record(self, index: int, record: dict) -> None:
+        """
+        Replaces the record of the test_data and updates results only for the lines and stops it affects.
+
+        :param index: index of the record in the test_data.
+        :param record: new dict with test_data.
+        """
+        self._check_editable(index)
+        old_record = self._database[index]
+        self._database[index] = record
+        self._update_records([index], [old_record])
+
+    def remove_record(self, index: int) -> None:
+        """
+        Removes the record of the test_data and updates results only for the lines and stops it affects.
+        The record is replaced with None, so indices of other records don't change.
+
+        :param index: index of the record in the test_data.
+        """
+        self._check_editable(index)
+        old_record = self._database[index]
+        self._database[index] = None
+        self._update_records([index], [old_record])
+
+    @staticmethod
+    def _record_key(record):
+        """Returns (bus_id, stop_id) of the record, which identifies it between versions, or None."""
+        if not isinstance(record, dict):
+            return None
+        key = (record.get("bus_id"), record.get("stop_id"))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    @classmethod
+    def _match_records(cls, old_database: list, database: list) -> tuple:
+        """
+        Matches the equal records of two versions of the test_data. The common beginning and end are matched
+        by position, the records between them by (bus_id, stop_id). Matches keep the order of the records,
+        so a record moved against the others isn't matched.
+
+        :return: (array, index of the new record for every old record or -1, True if matched records are
+                  at the same indices).
+        """
+        size = min(len(old_database), len(database))
+        prefix = 0
+        while prefix < size and old_database[prefix] == database[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < size - prefix and old_database[-suffix - 1] == database[-suffix - 1]:
+            suffix += 1
+        shift = len(database) - len(old_database)
+        old_to_new = array("q", range(prefix)) + array("q", [-1]) * (len(old_database) - prefix - suffix) + \
+            array("q", range(len(database) - suffix, len(database)))
+        old_indices = {}
+        for index in range(prefix, len(old_database) - suffix):
+            key = cls._record_key(old_database[index])
+            if key is not None:
+                old_indices.setdefault(key, []).append(index)
+        aligned = not shift
+        last_match = prefix - 1
+        for index in range(prefix, len(database) - suffix):
+            candidates = old_indices.get(cls._record_key(database[index]))
+            if not candidates:
+                continue
+            old_index = candidates.pop(0)
+            if old_index > last_match and old_database[old_index] == database[index]:
+                old_to_new[old_index] = index
+                last_match = old_index
+                aligned = aligned and old_index == index
+        return old_to_new, aligned
+
+    def update_database(self, database: list) -> None:
+        """
+        Replaces the test_data with the new version and updates results only for the records which were changed,
+        added or removed. Records are matched by (bus_id, stop_id), so records shifted by inserted or removed
+        ones aren't checked again.
+
+        :param database: list of dicts with test_data.
+        """
+        self._check_editable()
+        old_database = self._database
+        old_to_new, aligned = self._match_records(old_database, database)
+        if aligned:
+            indices = [index for index, new_index in enumerate(old_to_new) if new_index < 0]
+            old_records = [old_database[index] for index in indices]
+            for index in indices:
+                old_database[index] = database[index]
+            self._update_records(indices, old_records)
+            return
+        # unmatched records are removed, indices of the rest are shifted, then the new records are added
+        removed = [index for index, new_index in enumerate(old_to_new) if new_index < 0 and
+                   old_database[index] is not None]
+        old_records = [old_database[index] for index in removed]
+        for index in removed:
+            old_database[index] = None
+        self._update_records(removed, old_records)
+        matched = bytearray(len(database))
+        for new_index in old_to_new:
+            if new_index >= 0:
+                matched[new_index] = 1
+        self._reindex_records(old_to_new, list(database))
+        added = [index for index in range(len(database)) if not matched[index]]
+        self._update_records(added, [None] * len(added))
+
+    def _reindex_records(self, old_to_new, database: list) -> None:
+        """
+        Moves results of the records to their indices in the new version of the test_data.
+        Records without the new index must be removed before, records of the new test_data without the old one
+        must be added after it.
+
+        :param old_to_new: index of the new record for every old record or -1.
+        :param database: new version of the test_data.
+        """
+        self._database = database
+        if "scan" not in self._computed_stages:
+            return
+        self._scanned_records = len(database)
+        if self._error_details is not None:
+            self._error_details.reindex(old_to_new)
+        # rows are created only for the correct test_data
+        if len(self._record_rows) != len(old_to_new):
+            return
+        record_rows = array("q", [-1]) * len(database)
+        for index, row in enumerate(self._record_rows):
+            if row >= 0:
+                record_rows[old_to_new[index]] = row
+        self._record_rows = record_rows
+        row_records = self._row_records
+        for row, index in enumerate(row_records):
+            if index >= 0:
+                row_records[row] = old_to_new[index]
+        self._line_first_records = {bus_id: old_to_new[index] for bus_id, index in self._line_first_records.items()}
+
+    def get_stopped_at(self):
+        """Returns number of the scanned records if the scan was stopped because of max_errors, otherwise None."""
+        return self._stopped_at
+
+    def get_results(self) -> dict:
+        """
+        Returns the test_data and results of the computed stages, they can be saved and restored by restore_results().
+        Streamed test_data isn't kept.
+        """
+        results = dict(self.__dict__)
+        for option in ("_workers", "_arrival_time_backend", "_error_details", "_max_errors", "_profiler", "_bus_ids",
+                       "_a_time_range", "_transfer_index", "_transfer_memory"):
+            del results[option]
+        if self._streamed:
+            results["_database"] = None
+        return results
+
+    def restore_results(self, results: dict) -> None:
+        """
+        Restores the test_data and results returned by get_results(), stages computed before aren't run again.
+
+        :param results: dict returned by get_results().
+        """
+        self.__dict__.update(results)
+        if self._database is None:
+            self._database = iter(())
+
+    def get_stage_results(self) -> dict:
+        """
+        Returns results of the checks without the test_data and the columns of the stops, they are restored
+        by restore_stage_results(). Stages which aren't computed yet are computed first, so the restored processor
+        answers every check except error_details.
+        """
+        self.validate()
+        return dict(stages=set(self._computed_stages), scanned_records=self._scanned_records,
+                    stopped_at=self._stopped_at, type_errors=dict(self._type_errors),
+                    format_errors=dict(self._format_errors), route_errors=list(self._route_errors),
+                    lines=[(bus_id, len(bus["stops"]), bus["start"], bus["finish"])
+                           for bus_id, bus in self._bus_route_info.items()],
+                    transfer_stops=list(self._transfer_stops), arrival_time_errors=list(self._arrival_time_errors),
+                    demand_stops_errors=set(self._demand_stops_errors))
+
+    def restore_stage_results(self, results: dict) -> None:
+        """
+        Restores results returned by get_stage_results(), the checks aren't run again.
+        The test_data isn't restored, so it can't be printed or changed, like the streamed one.
+
+        :param results: dict returned by get_stage_results().
+        """
+        self._database = iter(())
+        self._streamed = True
+        self._reset_results()
+        self._scanned_records = results["scanned_records"]
+        self._stopped_at = results["stopped_at"]
+        self._type_errors.update(results["type_errors"])
+        self._format_errors.update(results["format_errors"])
+        self._total_type_errors = sum(self._type_errors.values())
+        self._total_format_errors = sum(self._format_errors.values())
+        self._route_errors = results["route_errors"]
+        for bus_id, stops, start, finish in results["lines"]:
+            self._bus_route_info[bus_id] = dict(start=start, stops=RestoredRouteStops(stops), finish=finish)
+        self._transfer_stops = results["transfer_stops"]
+        self._arrival_time_errors = results["arrival_time_errors"]
+        self._demand_stops_errors = results["demand_stops_errors"]
+        self._computed_stages = results["stages"]
+
+    @classmethod
+    def from_shards(cls, file_names: list, workers: int = 1, json_decoder: str = "auto", stream: bool = False,
+                    **options) -> "DatabaseProcessor":
+        """
+        Creates processor of the test_data split into several files, e.g. one file per depot.
+        Files are parsed and scanned in parallel by workers processes, their results are merged in order
+        of file_names as if the files were one array, so routes may span files and transfer stops are found
+        across them. Stops aren't kept, like streamed test_data.
+
+        :param file_names: paths to the .json files, see expand_database_paths().
+        :param workers: number of processes for files and for route checks.
+        :param json_decoder: name of the json decoder, see JSON_DECODERS.
+        :param stream: files are read stop by stop, see iter_database_file().
+        :param options: other options of DatabaseProcessor except error_details. max_errors is the budget
+                        of every file and of all of them, the files after the one which exceeded it are dropped.
+        :return: processor with the computed scan stage.
+        """
+        from contextlib import nullcontext
+        processor = cls(iter(()), workers=workers, **options)
+        options = dict(max_errors=processor._max_errors, transfer_index=processor._transfer_index,
+                       bus_ids=processor._bus_ids,
+                       a_time_range=processor._a_time_range and tuple(A_TIMES[minutes]
+                                                                      for minutes in processor._a_time_range))
+        shards = [(file_name, json_decoder, stream, options) for file_name in file_names]
+        profiler = processor._profiler
+        parallel = workers > 1 and len(shards) > 1
+        if parallel:
+            from concurrent.futures import ProcessPoolExecutor
+        with profiler.stage("_scan_shards") if profiler is not None else nullcontext() as stats, \
+                ProcessPoolExecutor(max_workers=min(workers, len(shards))) if parallel else nullcontext() as executor:
+            for results in executor.map(_scan_shard, shards) if parallel else map(_scan_shard, shards):
+                processor._merge_shard(results)
+                if processor._stopped_at is not None:
+                    # files which aren't scanned yet are dropped
+                    if parallel:
+                        executor.shutdown(wait=False, cancel_futures=True)
+                    break
+            if stats is not None:
+                stats["records"] = processor._scanned_records
+        processor._total_type_errors = sum(processor._type_errors.values())
+        processor._total_format_errors = sum(processor._format_errors.values())
+        if processor._total_type_errors or processor._total_format_errors:
+            processor._clear_routes()
+        processor._computed_stages.add("scan")
+        return processor
+
+    def _merge_shard(self, results: dict) -> None:
+        """
+        Adds results of the scan of the next file to the results of the previous files.
+
+        :param results: dict returned by _scan_shard().
+        """
+        record_offset = self._scanned_records
+        self._scanned_records += results["_scanned_records"]
+        if results["_stopped_at"] is not None:
+            self._stopped_at = record_offset + results["_stopped_at"]
+        for key, errors in results["_type_errors"].items():
+            self._type_errors[key] += errors
+        for key, errors in results["_format_errors"].items():
+            self._format_errors[key] += errors
+        if self._max_errors is not None and self._stopped_at is None and \
+                sum(self._type_errors.values()) + sum(self._format_errors.values()) > self._max_errors:
+            self._stopped_at = self._scanned_records
+        if results["_total_type_errors"] or results["_total_format_errors"] or self._stopped_at is not None:
+            # routes are useless for the broken test_data
+            return
+        row_offset = self._columns.extend(results["_columns"])
+        self._record_rows.extend(row + row_offset if row >= 0 else -1 for row in results["_record_rows"])
+        self._row_records.extend(index + record_offset for index in results["_row_records"])
+        for bus_id, shard_bus in results["_bus_route_info"].items():
+            bus = self._bus_route_info.get(bus_id)
+            if bus is None:
+                bus = self._bus_route_info[bus_id] = dict(start=[], stops=RouteStops(self._columns), finish=[])
+                self._line_first_records[bus_id] = record_offset + results["_line_first_records"][bus_id]
+            bus["stops"].rows.extend(row + row_offset for row in shard_bus["stops"].rows)
+            bus["start"].extend(shard_bus["start"])
+            bus["finish"].extend(shard_bus["finish"])
+        for stop_name, lines in results["_stop_lines"].items():
+            self._stop_lines.setdefault(stop_name, set()).update(lines)
+        self._on_demand_stops.update(results["_on_demand_stops"])
+
+    def export_snapshot(self, file_name: str) -> None:
+        """
+        Writes the test_data with routes and results of the checks to the binary snapshot, which is reopened
+        by load_snapshot() without parsing. Only the test_data which passes all checks is exported.
+
+        :param file_name: path to the snapshot file.
+        """
+        from utils.processor_results import CheckError
+        from utils.processor_snapshot import write_snapshot
+        if self._bus_ids is not None or self._a_time_range is not None:
+            raise SnapshotProcessorError("Filtered test_data can't be exported")
+        if self._stopped_at is not None:
+            raise SnapshotProcessorError("The scan was stopped because of max_errors, the test_data can't be exported")
+        for result in self.validate().values():
+            if isinstance(result, CheckError):
+                raise SnapshotProcessorError(f"The {result.check} check failed, the test_data can't be exported: "
+                                             f"{result.error}")
+        if len(self._record_rows) != self._scanned_records:
+            raise SnapshotProcessorError("Rows of the records aren't kept, the test_data can't be exported")
+        self._find_transfer_stops()
+        columns = self._columns
+        route_offsets = array("q", [0])
+        route_rows = array("L")
+        for bus in self._bus_route_info.values():
+            route_rows.extend(bus["stops"].rows)
+            route_offsets.append(len(route_rows))
+        header = dict(scanned_records=self._scanned_records, type_errors=self._type_errors,
+                      format_errors=self._format_errors,
+                      lines=[[bus_id, self._line_first_records[bus_id], bus["start"], bus["finish"]]
+                             for bus_id, bus in self._bus_route_info.items()],
+                      on_demand_stops=self._on_demand_stops, transfer_stops=self._transfer_stops,
+                      demand_stops_errors=sorted(self._demand_stops_errors))
+        names = [name.encode() for name in columns.names]
+        name_offsets = array("q", [0])
+        for name in names:
+            name_offsets.append(name_offsets[-1] + len(name))
+        sections = {field: getattr(columns, field) for field in self.SNAPSHOT_COLUMNS}
+        sections.update(names=b"".join(names), name_offsets=name_offsets, record_rows=self._record_rows,
+                        row_records=self._row_records, route_offsets=route_offsets, route_rows=route_rows)
+        write_snapshot(file_name, header, sections)
+
+    @classmethod
+    def load_snapshot(cls, file_name: str, **options) -> "DatabaseProcessor":
+        """
+        Opens the snapshot written by export_snapshot(). Columns of the stops and routes are read-only views
+        of the memory-mapped file, records are created from them when they are read.
+        Results of all checks are restored, so they aren't computed again. The test_data can't be changed.
+
+        :param file_name: path to the snapshot file.
+        :param options: options of DatabaseProcessor except filters.
+        :return: processor with results of all stages.
+        """
+        from utils.processor_snapshot import read_snapshot, SnapshotNames, SnapshotRecords
+        header, sections = read_snapshot(file_name)
+        columns = StopColumns()
+        for field in cls.SNAPSHOT_COLUMNS:
+            setattr(columns, field, sections[field])
+        # names aren't interned again, the columns aren't changed
+        columns.names = SnapshotNames(sections["names"], sections["name_offsets"])
+        processor = cls(SnapshotRecords(columns, sections["record_rows"]), **options)
+        if processor._bus_ids is not None or processor._a_time_range is not None:
+            raise SnapshotProcessorError("Snapshot can't be filtered")
+        processor._columns = columns
+        processor._record_rows = sections["record_rows"]
+        processor._row_records = sections["row_records"]
+        processor._scanned_records = header["scanned_records"]
+        processor._type_errors.update(header["type_errors"])
+        processor._format_errors.update(header["format_errors"])
+        route_offsets = sections["route_offsets"]
+        route_rows = sections["route_rows"]
+        for index, (bus_id, first_record, start, finish) in enumerate(header["lines"]):
+            stops = RouteStops(columns)
+            stops.rows = route_rows[route_offsets[index]:route_offsets[index + 1]]
+            processor._bus_route_info[bus_id] = dict(start=list(map(tuple, start)), stops=stops,
+                                                     finish=list(map(tuple, finish)))
+            processor._line_first_records[bus_id] = first_record
+        processor._on_demand_stops.update(header["on_demand_stops"])
+        processor._transfer_stops = header["transfer_stops"]
+        processor._demand_stops_errors.update(header["demand_stops_errors"])
+        processor._computed_stages.update(("scan", "routes", "transfer", "arrival_time", "demand"))
+        return processor
+
+    def _check_editable(self, index: int = None) -> None:
+        """Raises ProcessorError if the test_data can't be changed or there is no such record."""
+        if self._streamed:
+            raise ProcessorError("Streamed test_data can't be changed")
+        from utils.processor_snapshot import SnapshotRecords
+        if isinstance(self._database, SnapshotRecords):
+            raise ProcessorError("Test_data of the snapshot can't be changed")
+        if self._stopped_at is not None:
+            raise ProcessorError("The scan was stopped because of max_errors, the test_data can't be changed")
+        if self._bus_ids is not None or self._a_time_range is not None:
+            raise ProcessorError("Filtered test_data can't be changed")
+        if self._transfer_index != "sets":
+            raise ProcessorError("Changes of the test_data require the 'sets' transfer index")
+        if index is not None and (not 0 <= index < len(self._database) or self._database[index] is None):
+            raise ProcessorError(f"There is no record {index}")
+
+    @_profiled_stage
+    def _update_records(self, indices, old_records: list) -> None:
+        """
+        Updates results after records of the test_data with indices were changed, old_records are their
+        previous values (None for the new records). State after the update is the same as after a full run.
+        Stages which aren't computed yet stay lazy.
+
+        :param indices: indices of the changed records.
+        :param old_records: previous values of the records.
+        """
+        if "scan" not in self._computed_stages or not indices:
+            return
+        self._scanned_records = len(self._database)
+        was_correct = not (self._total_type_errors or self._total_format_errors)
+        for old_record in old_records:
+            if old_record is not None:
+                self._count_stop_errors(old_record, -1)
+        if self._error_details is not None:
+            # every error detail is one error of the counters
+            discarded = self._total_type_errors + self._total_format_errors - sum(self._type_errors.values()) - \
+                sum(self._format_errors.values())
+            self._error_details.discard(indices, discarded)
+        for index in indices:
+            if self._database[index] is not None:
+                self._count_stop_errors(self._database[index], 1, index)
+        self._total_type_errors = sum(self._type_errors.values())
+        self._total_format_errors = sum(self._format_errors.values())
+        is_correct = not (self._total_type_errors or self._total_format_errors)
+        if was_correct and not is_correct:
+            self._clear_routes()
+        elif is_correct and not was_correct:
+            # routes were never created for the broken test_data, they are created by the full scan
+            self._reset_results()
+        elif is_correct:
+            self._update_routes(indices, old_records)
+
+    def _update_routes(self, indices, old_records: list) -> None:
+        """Updates routes and results of the later stages for the lines of the changed correct records."""
+        if "routes" not in self._computed_stages:
+            self._order_routes()
+        columns = self._columns
+        removed_rows = set()
+        affected_lines = set()
+        affected_stops = set()
+        for index, old_record in zip(indices, old_records):
+            if old_record is None:
+                continue
+            row = self._record_rows[index]
+            removed_rows.add(row)
+            self._free_rows.append(row)
+            self._row_records[row] = -1
+            affected_lines.add(old_record["bus_id"])
+            affected_stops.add(old_record["stop_name"])
+            if old_record["stop_type"] == "O":
+                self._on_demand_stops[old_record["stop_name"]] -= 1
+                if not self._on_demand_stops[old_record["stop_name"]]:
+                    del self._on_demand_stops[old_record["stop_name"]]
+        for index in indices:
+            if self._database[index] is not None:
+                affected_lines.add(self._database[index]["bus_id"])
+        # stops of the affected lines are indexed again
+        line_rows = {}
+        for bus_id in affected_lines:
+            rows = self._bus_route_info[bus_id]["stops"].rows if bus_id in self._bus_route_info else []
+            line_rows[bus_id] = [row for row in rows if row not in removed_rows]
+            for row in rows:
+                name = columns.name(row)
+                affected_stops.add(name)
+                lines = self._stop_lines.get(name)
+                if lines is not None:
+                    lines.discard(bus_id)
+                    if not lines:
+                        del self._stop_lines[name]
+        for index in indices:
+            stop = self._database[index]
+            if index == len(self._record_rows):
+                self._record_rows.append(-1)
+            if stop is None:
+                self._record_rows[index] = -1
+                continue
+            if self._free_rows:
+                row = self._free_rows.pop()
+                columns.set(row, stop)
+                self._row_records[row] = index
+            else:
+                row = columns.append(stop)
+                self._row_records.append(index)
+            self._record_rows[index] = row
+            line_rows[stop["bus_id"]].append(row)
+            affected_stops.add(stop["stop_name"])
+            if stop["stop_type"] == "O":
+                self._on_demand_stops[stop["stop_name"]] += 1
+
+        order_changed = False
+        for bus_id, rows in line_rows.items():
+            if not rows:
+                order_changed = order_changed or bus_id in self._bus_route_info
+                self._bus_route_info.pop(bus_id, None)
+                self._line_first_records.pop(bus_id, None)
+                continue
+            # rows are in order of the records, as after the full scan
+            rows.sort(key=self._row_records.__getitem__)
+            first_record = self._row_records[rows[0]]
+            if self._line_first_records.get(bus_id) != first_record:
+                order_changed = True
+                self._line_first_records[bus_id] = first_record
+            self._bus_route_info[bus_id] = dict(start=[], stops=RouteStops(columns, rows), finish=[])
+            for row in rows:
+                self._stop_lines.setdefault(columns.name(row), set()).add(bus_id)
+        if order_changed:
+            self._bus_route_info = dict(sorted(self._bus_route_info.items(),
+                                               key=lambda item: self._line_first_records[item[0]]))
+
+        self._route_errors = [error for error in self._route_errors if error[0] not in affected_lines]
+        self._order_routes([bus_id for bus_id in self._bus_route_info if bus_id in affected_lines])
+        # errors are in order of the lines, as after the full run
+        route_errors = dict(self._route_errors)
+        self._route_errors = [(bus_id, route_errors[bus_id]) for bus_id in self._bus_route_info if bus_id in route_errors]
+        self._computed_stages.discard("transfer")
+        if self._route_errors:
+            self._arrival_time_errors = []
+            self._demand_stops_errors = set()
+            self._computed_stages.difference_update({"arrival_time", "demand"})
+            return
+
+        if "arrival_time" in self._computed_stages:
+            time_errors = dict(self._arrival_time_errors)
+            for bus_id in affected_lines:
+                time_errors.pop(bus_id, None)
+                bus = self._bus_route_info.get(bus_id)
+                index = _find_route_arrival_time_error(bus["stops"].minutes()) if bus else None
+                if index is not None:
+                    time_errors[bus_id] = bus["stops"][index][0]
+            self._arrival_time_errors = [(bus_id, time_errors[bus_id])
+                                         for bus_id in self._bus_route_info if bus_id in time_errors]
+        if "demand" in self._computed_stages:
+            if self._arrival_time_errors:
+                self._demand_stops_errors = set()
+                self._computed_stages.discard("demand")
+                return
+            for name in affected_stops:
+                if name in self._on_demand_stops and len(self._stop_lines.get(name, ())) > 1:
+                    self._demand_stops_errors.add(name)
+                else:
+                    self._demand_stops_errors.discard(name)
+
     def _check_data_type(self) -> None:
         """
         Check input test_data for compliance with documentation.
         Fields 'stop_name', 'a_time' should not be empty.
         Errors are sorted and added to the _type_errors dictionary. The total number of errors is also calculated.
         """
-        correct_data_type = dict(bus_id=int, stop_id=int, stop_name=str, next_stop=int, stop_type=str, a_time=str)
-        required_fields = ("stop_name", 'a_time')
-        for stop in self._database:
-            for key, value in stop.items():
-                if type(value) != correct_data_type[key]:
-                    self._type_errors[key] += 1
-                    continue
-                stop_type_pattern = r"""
-                ^                           # start of string
-                .                           # any of chapter
-                ?                           # zero or one consecutive letter
-                $                           # end of string    
-                """
-                stop_type_regex = re.compile(stop_type_pattern, re.VERBOSE)
-                if key == "stop_type" and not stop_type_regex.match(value):
-                    self._type_errors[key] += 1
-                if key in required_fields and value == "":
-                    self._type_errors[key] += 1
-        self._total_type_errors = sum(self._type_errors.values())
+        if "scan" not in self._computed_stages:
+            self._scan_database()
 
     def _data_type_validator(func):
         @wraps(func)
         def wrapper(*args):
             # check type of test_data
-            if args[0]._total_type_errors == 0:
-                args[0]._check_data_type()
+            args[0]._check_data_type()
             ret = func(*args)
             return ret
 
         return wrapper
 
     @_data_type_validator
+    def check_data_type(self) -> "DataTypeResult":
+        """Returns result of _check_data_type()"""
+        from utils.processor_results import DataTypeResult
+        return DataTypeResult(self._total_type_errors, dict(self._type_errors), self._stopped_at)
+
     def print_data_type_errors(self) -> None:
         """Prints result _check_data_type()"""
-        print(f"Type and required field validation: {self._total_type_errors} errors")
-        for k, v in self._type_errors.items():
+        result = self.check_data_type()
+        print(f"Type and required field validation: {result.errors} errors")
+        if result.stopped_at is not None:
+            print(f"Stopped after {result.stopped_at} records: more than {self._max_errors} errors")
+        for k, v in result.fields.items():
             print(f'{k}: {v}')
 
     @_data_type_validator
@@ -81,67 +964,30 @@ class DatabaseProcessor:
         """
         if self._total_type_errors != 0:
             raise DataTypeProcessorError("Data contain {} type errors".format(self._total_type_errors))
-        stop_name_pattern = r"""
-        ^                                   # start of string
-        (                                   # start of first part of name 
-        [A-Z]                               # first capital letter of word
-        \w                                  # any letter, digit or underscore. Equivalent to [a-zA-Z0-9_]
-        +                                   # one or more consecutive `\w` characters.
-        \s                                  # any whitespace chapters
-        )                                   # end of first part of name
-        +                                   # one or more consecutive words with capital letter
-        (                                   # start of second part of word
-        Road|Avenue|Boulevard|Street        # one of this word is end of second part name
-        )                                   # end of second part of word                    
-        $                                   # end of string
-        """
-        stop_type_pattern = r"""
-        ^                                   # start of string                       
-        [SOF]                               # a single chapter of: S,O or F 
-        ?                                   # zero or one consecutive letter
-        $                                   # end of string
-        """
-        a_time_pattern = r"""
-        ^                                   # start of string 
-        (                                   # start of hour part
-        [01]                                # first digit 1 or 0
-        \d                                  # any of digit
-        |                                   # or 
-        2                                   # digit 2
-        [0-3]                               # a single chapter of: 0,1,2 or 3 
-        )                                   # end of hour part
-        (:)                                 # delimiter  
-        (                                   # end of minutes part
-        [0-5]                               # a single chapter of: 0-5 
-        \d                                  # any of digit
-        )                                   # end of minutes part
-        $                                   # end of string
-        """
-        validation_fields = {'stop_name': re.compile(stop_name_pattern, re.VERBOSE),
-                             'stop_type': re.compile(stop_type_pattern, re.VERBOSE),
-                             'a_time': re.compile(a_time_pattern, re.VERBOSE)}
-        for stop in self._database:
-            for key, value in stop.items():
-                if key in validation_fields and not validation_fields[key].match(value):
-                    self._format_errors[key] += 1
-        self._total_format_errors = sum(self._format_errors.values())
 
     def _data_format_validator(func):
         @wraps(func)
         def wrapper(*args):
             # check format of test_data
-            if args[0]._total_format_errors == 0:
-                args[0]._check_format_fields()
+            args[0]._check_format_fields()
             ret = func(*args)
             return ret
 
         return wrapper
 
     @_data_format_validator
+    def check_format_fields(self) -> "FormatFieldsResult":
+        """Returns result of _check_format_fields()"""
+        from utils.processor_results import FormatFieldsResult
+        return FormatFieldsResult(self._total_format_errors, dict(self._format_errors), self._stopped_at)
+
     def print_format_fields_errors(self) -> None:
         """Prints result of _check_format_fields()"""
-        print(f"Format validation: {self._total_format_errors} errors")
-        for k, v in self._format_errors.items():
+        result = self.check_format_fields()
+        print(f"Format validation: {result.errors} errors")
+        if result.stopped_at is not None:
+            print(f"Stopped after {result.stopped_at} records: more than {self._max_errors} errors")
+        for k, v in result.fields.items():
             print(f'{k}: {v}')
 
     @_data_format_validator
@@ -154,111 +1000,188 @@ class DatabaseProcessor:
                         [("Prospekt Avenue", "08:12"),("Elm Street", "08:19"), ... , ("Sesame Street", "08:37")],
                         [("Sesame Street", "08:37")]},
                 ...}
+        'stops' is a RouteStops, it reads pairs from rows of _columns instead of keeping them.
+        Stops are ordered by next_stop links, not by their order in the database. Broken routes are added
+        to _route_errors as (bus_id, description) pairs.
         """
         if self._total_type_errors:
             raise DataTypeProcessorError("Data contain {} type errors".format(self._total_type_errors))
 
-        self._check_format_fields()
         if self._total_format_errors:
             raise FormatFieldsProcessorError("Data contain {} format errors".format(self._total_format_errors))
 
-        for stop in self._database:
-            bus_id = stop['bus_id']
-            bus = self._bus_route_info.setdefault(bus_id, dict(start=[], stops=[], finish=[]))
-            stop_info = (stop["stop_name"], stop["a_time"])
-            bus["stops"].append(stop_info)
-            if stop["stop_type"] == "S":
-                bus["start"].append(stop_info)
-            elif stop["stop_type"] == "F":
-                bus["finish"].append(stop_info)
+        if "routes" not in self._computed_stages:
+            self._order_routes()
+        if self._route_errors:
+            raise RouteProcessorError("Data contain {} route errors: {}".format(len(self._route_errors),
+                                                                               self._route_errors))
+
+    @_profiled_stage
+    def _order_routes(self, bus_ids=None) -> None:
+        """
+        Puts stops of the routes in order of next_stop links and checks the links.
+
+        :param bus_ids: lines to process, all lines if it is None.
+        """
+        columns = self._columns
+        start_code = STOP_TYPE_CODES["S"]
+        finish_code = STOP_TYPE_CODES["F"]
+        cut_by_window = self._a_time_range is not None
+        for bus_id in self._bus_route_info if bus_ids is None else bus_ids:
+            bus = self._bus_route_info[bus_id]
+            rows, error = _order_route(columns, bus["stops"].rows, cut_by_window)
+            if error:
+                self._route_errors.append((bus_id, error))
+            else:
+                bus["stops"] = RouteStops(columns, rows)
+            bus["start"] = [columns.stop_info(row) for row in rows if columns.stop_type[row] == start_code]
+            bus["finish"] = [columns.stop_info(row) for row in rows if columns.stop_type[row] == finish_code]
+        self._computed_stages.add("routes")
 
     def _stops_handler(func):
         @wraps(func)
         def wrapper(*args):
             # calculate stops
-            if not args[0]._bus_route_info:
-                args[0]._calculate_stops()
+            args[0]._calculate_stops()
             ret = func(*args)
             return ret
 
         return wrapper
 
     @_stops_handler
+    def check_bus_info(self) -> "BusInfoResult":
+        """Returns number of stops of every line."""
+        from utils.processor_results import BusInfoResult
+        return BusInfoResult([(bus_id, len(bus["stops"])) for bus_id, bus in self._bus_route_info.items()])
+
     def print_bus_info(self) -> None:
         """Prints info about buses routes."""
         print("Line names and number of stops:")
-        for bus_id, stops in self._bus_route_info.items():
-            print(f'bus_id: {bus_id}, stops: {len(stops["stops"])}')
+        for bus_id, stops in self.check_bus_info().lines:
+            print(f'bus_id: {bus_id}, stops: {stops}')
 
     @_stops_handler
+    @_profiled_stage
     def _find_transfer_stops(self) -> list:
         """
         Finds transfer stops. A transfer stop is a stop that is included in several routes.
+        The stop is counted once for a route, even if the route passes it several times.
 
-        :return: List of transfer stops.
+        :return: Sorted list of transfer stops.
         """
-        routes_stops = [stop[0] for stops in self._bus_route_info.values() for stop in stops["stops"]]
-        stop_frequency = Counter(routes_stops).most_common()
-        transfer_stops = sorted([stop[0] for stop in stop_frequency if stop[1] > 1])
-        return transfer_stops
+        if "transfer" in self._computed_stages:
+            return self._transfer_stops
+        if self._transfer_index == "compact":
+            from utils.processor_transfer import find_transfer_stops_compact
+            self._transfer_stops = find_transfer_stops_compact(self._columns)
+        elif self._transfer_index == "sketch":
+            from utils.processor_transfer import find_transfer_stops_sketch
+            self._transfer_stops = find_transfer_stops_sketch(self._columns, self._transfer_memory)
+        else:
+            # the index of lines has stops of the skipped lines too, only stops of the checked ones are reported
+            stops = self._columns.names if self._bus_ids is not None or self._a_time_range is not None \
+                else self._stop_lines
+            self._transfer_stops = sorted(stop for stop in stops if len(self._stop_lines[stop]) > 1)
+        self._computed_stages.add("transfer")
+        return self._transfer_stops
 
     @_stops_handler
-    def print_stops_info(self) -> None:
-        """Prints info about types of stops."""
+    def _find_terminal_stops(self) -> tuple:
+        """
+        Finds start and finish stops of the routes, every route must have exactly one start and one finish stop.
+
+        :return: (bus_id of the first line without start or finish stop or None, set of start stops,
+                  set of finish stops).
+        """
         start_stops = set()
         finish_stops = set()
-        for bus_id, stops in self._bus_route_info.items():
-            if len(stops['start']) != 1 or len(stops["finish"]) != 1:
-                print(f'There is no start or end stop for the line: {bus_id}.')
-                break
-            else:
-                start_stops.update([i[0] for i in stops["start"]])
-                finish_stops.update([i[0] for i in stops["finish"]])
+        routes = [(bus["start"], bus["finish"]) for bus in self._bus_route_info.values()]
+        find_terminal_stops = partial(_find_route_terminal_stops, cut_by_window=self._a_time_range is not None)
+        for bus_id, terminal_stops in zip(self._bus_route_info, self._map_routes(find_terminal_stops, routes)):
+            if terminal_stops is None:
+                return bus_id, start_stops, finish_stops
+            start_stops.add(terminal_stops[0])
+            finish_stops.add(terminal_stops[1])
+        start_stops.discard(None)
+        finish_stops.discard(None)
+        return None, start_stops, finish_stops
+
+    def check_stops_info(self) -> "StopsInfoResult":
+        """Returns start, transfer and finish stops or the line without start or finish stop."""
+        from utils.processor_results import StopsInfoResult
+        broken_line, start_stops, finish_stops = self._find_terminal_stops()
+        if broken_line is not None:
+            return StopsInfoResult(broken_line, [], [], [])
+        return StopsInfoResult(None, sorted(start_stops), self._find_transfer_stops(), sorted(finish_stops))
+
+    def print_stops_info(self) -> None:
+        """Prints info about types of stops."""
+        result = self.check_stops_info()
+        if result.line_without_start_or_finish is not None:
+            print(f'There is no start or end stop for the line: {result.line_without_start_or_finish}.')
         else:
-            print(f'Start stops: {len(start_stops)} {sorted(start_stops)}')
-            transfer_stops = self._find_transfer_stops()
-            print(f'Transfer stops: {len(transfer_stops)} {transfer_stops}')
-            print(f'Finish stops: {len(finish_stops)} {sorted(finish_stops)}')
+            print(f'Start stops: {len(result.start)} {result.start}')
+            print(f'Transfer stops: {len(result.transfer)} {result.transfer}')
+            print(f'Finish stops: {len(result.finish)} {result.finish}')
 
     @_stops_handler
+    @_profiled_stage
     def _check_arrival_time_errors(self) -> None:
         """
         Checks the time on the route, if the time of the next station is less or more than the previous one,
         the program adds an error to the time_errors list and stops checking this route
         and starts checking the next one.
         """
-        for bus_id, bus in self._bus_route_info.items():
-            previous_time = 0
-            for stop_name, time in bus["stops"]:
-                hours, minutes = time.split(":")
-                current_time = int(hours) * 60 + int(minutes)
-                if current_time <= previous_time:
-                    self._arrival_time_errors.append((bus_id, stop_name))
-                    break
-                previous_time = current_time
+        if "arrival_time" in self._computed_stages:
+            return
+        if self._choose_arrival_time_backend() == "numpy":
+            routes = [bus["stops"] for bus in self._bus_route_info.values()]
+            errors = find_arrival_time_errors_vectorized(self._columns, routes)
+        else:
+            routes = [bus["stops"].minutes() for bus in self._bus_route_info.values()]
+            errors = self._map_routes(_find_route_arrival_time_error, routes)
+        for (bus_id, bus), index in zip(self._bus_route_info.items(), errors):
+            if index is not None:
+                self._arrival_time_errors.append((bus_id, bus["stops"][index][0]))
+        self._computed_stages.add("arrival_time")
+
+    def _choose_arrival_time_backend(self) -> str:
+        """Returns the backend of the arrival time check, "auto" is resolved by the number of the stops."""
+        if self._arrival_time_backend != "auto":
+            return self._arrival_time_backend
+        if self._workers > 1:
+            return "python"
+        min_rows = NUMPY_MIN_ROWS if "numpy" in sys.modules else NUMPY_IMPORT_MIN_ROWS
+        return "numpy" if len(self._columns) >= min_rows and has_numpy() else "python"
 
     def _arrival_time_validator(func):
         @wraps(func)
         def wrapper(*args):
             # check arrival time
-            if not args[0]._arrival_time_errors:
-                args[0]._check_arrival_time_errors()
+            args[0]._check_arrival_time_errors()
             ret = func(*args)
             return ret
 
         return wrapper
 
     @_arrival_time_validator
+    def check_time_errors(self) -> "TimeErrorsResult":
+        """Returns result of _check_arrival_time_errors()"""
+        from utils.processor_results import TimeErrorsResult
+        return TimeErrorsResult(list(self._arrival_time_errors))
+
     def print_arrival_time_errors(self) -> None:
         """Prints result of check_time_errors()"""
+        result = self.check_time_errors()
         print("Arrival time test:")
-        if self._arrival_time_errors:
-            for bus, stop in self._arrival_time_errors:
+        if result.errors:
+            for bus, stop in result.errors:
                 print(f"bus_id line {bus}: wrong time on station {stop}")
         else:
             print("OK")
 
     @_arrival_time_validator
+    @_profiled_stage
     def _check_demand_errors(self) -> None:
         """
         Are checking the errors if departure points, final stops and transfer stations have attribute -O("On-demand"),
@@ -266,17 +1189,80 @@ class DatabaseProcessor:
         """
         if self._arrival_time_errors:
             raise ArrivalTimeProcessorError("Data contain {} arrival time errors".format(self._arrival_time_errors))
-        transfer_stops = self._find_transfer_stops()
-        for i in self._database:
-            if i["stop_type"] == "O" and i["stop_name"] in transfer_stops:
-                self._demand_stops_errors.add(i["stop_name"])
+        if "demand" in self._computed_stages:
+            return
+        if self._transfer_index == "sets":
+            self._demand_stops_errors.update(stop for stop in self._on_demand_stops
+                                             if len(self._stop_lines[stop]) > 1)
+        else:
+            self._demand_stops_errors.update(stop for stop in self._find_transfer_stops()
+                                             if stop in self._on_demand_stops)
+        self._computed_stages.add("demand")
+
+    def check_demand_errors(self) -> "DemandErrorsResult":
+        """Returns result of _check_demand_errors(), stops are sorted alphabetically."""
+        self._check_demand_errors()
+        from utils.processor_results import DemandErrorsResult
+        return DemandErrorsResult(sorted(self._demand_stops_errors))
 
     def print_demand_errors(self) -> None:
         """
         Are printing the errors if departure points, final stops and transfer stations have attribute -O("On-demand").
         The errors are also sorted alphabetically.
         """
-        if not self._demand_stops_errors:
-            self._check_demand_errors()
+        result = self.check_demand_errors()
         print("On demand stops test:")
-        print("Wrong stop type: {0}".format(sorted(self._demand_stops_errors)) if self._demand_stops_errors else "OK")
+        print("Wrong stop type: {0}".format(result.errors) if result.errors else "OK")
+
+    def check_error_details(self) -> "ErrorDetailsResult":
+        """
+        Returns index, field and value of the type and format errors collected by error_details.
+        The numbers of errors are exact, details are a uniform sample of them if there are more errors than its limit.
+        """
+        from utils.processor_results import ErrorDetailsResult
+        if self._error_details is None:
+            raise ProcessorError("Details of errors aren't collected, pass error_details to DatabaseProcessor")
+        self._check_data_type()
+        return ErrorDetailsResult(self._total_type_errors, self._total_format_errors,
+                                  sorted(self._error_details.samples, key=lambda detail: detail[0]))
+
+    def print_error_details(self) -> None:
+        """Prints result of check_error_details()"""
+        result = self.check_error_details()
+        print(f"Error details: {result.type_errors} type errors, {result.format_errors} format errors, "
+              f"{len(result.details)} shown")
+        for index, field, value, error in result.details:
+            print(f"record {index}: {error} error in {field}: {value!r}")
+
+    def check_database(self) -> "DatabaseResult":
+        """Returns records of the input test_data."""
+        if self._streamed and "scan" in self._computed_stages:
+            raise ProcessorError("Streamed test_data has already been processed and can't be printed")
+        from utils.processor_results import DatabaseResult
+        return DatabaseResult(self._database)
+
+    def validate(self) -> dict:
+        """
+        Runs all checks in order of their dependencies and returns their results. The check failed because of errors
+        found by the previous checks has CheckError instead of the result.
+
+        :return: dict, name of the check -> CheckResult.
+        """
+        from utils.processor_results import CheckError
+        results = {}
+        for name, check in self.CHECKS.items():
+            try:
+                results[name] = check(self)
+            except ProcessorError as e:
+                results[name] = CheckError(name, f"{type(e).__name__}: {e}")
+        return results
+
+    # checks in order of their dependencies
+    CHECKS = {
+        "data_type": check_data_type,
+        "format_fields": check_format_fields,
+        "bus_info": check_bus_info,
+        "stops_info": check_stops_info,
+        "time_errors": check_time_errors,
+        "demand_errors": check_demand_errors,
+    }